@@ -1,10 +1,19 @@
+import asyncio
+import contextvars
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
+import metrics
+from cache import TTLCache
+
 # Load environment variables
 load_dotenv()
 
@@ -14,13 +23,109 @@ SECRET_KEY = os.getenv("SECRET_KEY", "a_default_secret_for_development_only")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 240
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# How long a user's id/role read from the users table is reused (for tokens
+# whose claims can't be trusted, see claims_principal).
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "4096"))
+
+# bcrypt cost factor. Hashes made with fewer rounds are upgraded on the user's next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Max concurrent bcrypt operations; bcrypt releases the GIL, so threads use separate cores.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def verify_password(plain, hashed): return pwd_context.verify(plain, hashed)
-def get_password_hash(password): return pwd_context.hash(password)
+# All hashing goes through this pool so a burst of logins can't use more than
+# PASSWORD_HASH_WORKERS cores or block the event loop.
+_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+def _submit_hash(operation, fn, *args):
+    # Runs in a copy of the caller's context so the time is charged to its request.
+    return _hash_pool.submit(contextvars.copy_context().run, metrics.timed_hash, operation, fn, *args)
+
+def verify_password(plain, hashed): return _submit_hash("verify", pwd_context.verify, plain, hashed).result()
+def get_password_hash(password): return _submit_hash("hash", pwd_context.hash, password).result()
+
+async def averify_and_update(plain, hashed):
+    """
+    Verifies a password without blocking the event loop.
+    Returns (valid, new_hash); new_hash is set when the stored hash uses outdated settings.
+    """
+    return await asyncio.wrap_future(_submit_hash("verify", pwd_context.verify_and_update, plain, hashed))
+
+async def aget_password_hash(password):
+    return await asyncio.wrap_future(_submit_hash("hash", pwd_context.hash, password))
+
 def create_access_token(data, expires_delta=None):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=240))
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def create_user_token(user):
+    """Issues an access token carrying the user's id and role alongside their email."""
+    return create_access_token(
+        data={"sub": user.email, "uid": user.id, "role": user.role, "iat": int(time.time())},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """The authenticated caller, as needed by authorization checks."""
+    id: int
+    email: str
+    role: str
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(id=user.id, email=user.email, role=user.role)
+
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+# user id -> time.time() when their role (or account) last changed. Tokens
+# issued before then carry stale claims. Entries older than a token's lifetime
+# are dropped, since every token they could apply to has expired.
+_changed_at = {}
+_changed_lock = threading.Lock()
+# Tokens issued this long after a change are also checked: a login may read
+# the old role just before the change commits and sign its token a little later.
+CLAIMS_CHANGE_MARGIN = 60
+
+
+def invalidate_principal(user_id):
+    """Call after changing a user's role so the next request re-reads it."""
+    now = time.time()
+    with _changed_lock:
+        _changed_at[user_id] = now + CLAIMS_CHANGE_MARGIN
+        cutoff = now - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        for stale in [key for key, changed in _changed_at.items() if changed < cutoff]:
+            del _changed_at[stale]
+    principal_cache.invalidate(user_id)
+
+
+def claims_principal(payload: dict) -> Principal | None:
+    """
+    The principal described by a decoded token's claims, or None if they may be
+    stale: tokens from before the uid/role/iat claims existed, and tokens issued
+    no later than the user's last invalidate_principal. Those are checked
+    against the users table instead. A role change or account removal only
+    reaches these claims through invalidate_principal, so callers trust them
+    only while this process receives the invalidations of every other one.
+    """
+    user_id, role, issued_at = payload.get("uid"), payload.get("role"), payload.get("iat")
+    if user_id is None or role is None or issued_at is None:
+        return None
+    with _changed_lock:
+        changed_at = _changed_at.get(user_id)
+    if changed_at is not None and issued_at <= changed_at:
+        return None
+    return Principal(id=user_id, email=payload["sub"], role=role)
@@ -0,0 +1,172 @@
+import base64
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Literal
+
+from dotenv import load_dotenv
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session, selectinload
+
+import models
+import schemas
+import serialization
+from catalog import InvalidCursor
+
+load_dotenv()
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Rows fetched per query while streaming an export.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+ORDER_CSV_COLUMNS = [
+    "id", "order_date", "status", "customer_id", "customer_name",
+    "customer_phone", "customer_address", "total_amount",
+]
+USER_CSV_COLUMNS = ["id", "email", "full_name", "role"]
+
+ExportFormat = Literal["ndjson", "csv"]
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def encode_cursor(kind: str, key: list) -> str:
+    raw = json.dumps([kind, *key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(kind: str, cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_kind, *key = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if cursor_kind != kind:
+        raise InvalidCursor(f"Cursor was not issued for {kind}")
+    return key
+
+
+def list_orders(
+    db: Session,
+    *,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    status: str | None = None,
+    customer_id: int | None = None,
+    placed_from: datetime | None = None,
+    placed_to: datetime | None = None,
+    with_items: bool = True,
+):
+    """
+    Returns one page of orders, newest first, and the cursor for the next page.
+
+    Keyset-paginated on (order_date, id), so every page costs the same and is
+    read from the orders(order_date), orders(status, order_date) or
+    orders(customer_id, order_date) index depending on the filters.
+    `placed_to` is exclusive.
+    """
+    Order = models.Order
+    query = select(Order)
+    if status is not None:
+        query = query.where(Order.status == status)
+    if customer_id is not None:
+        query = query.where(Order.customer_id == customer_id)
+    if placed_from is not None:
+        query = query.where(Order.order_date >= placed_from)
+    if placed_to is not None:
+        query = query.where(Order.order_date < placed_to)
+    if cursor is not None:
+        key = decode_cursor("orders", cursor)
+        try:
+            last_date, last_id = key
+            key = (datetime.fromisoformat(last_date), int(last_id))
+        except (ValueError, TypeError):
+            raise InvalidCursor("Malformed cursor")
+        query = query.where(tuple_(Order.order_date, Order.id) < key)
+    if with_items:
+        query = query.options(selectinload(Order.items))
+    query = query.order_by(Order.order_date.desc(), Order.id.desc())
+
+    # Fetch one extra row to know whether another page exists without a COUNT(*).
+    rows = db.scalars(query.limit(limit + 1)).all()
+    orders = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = orders[-1]
+        next_cursor = encode_cursor("orders", [last.order_date.isoformat(), last.id])
+    return orders, next_cursor
+
+
+def list_users(db: Session, *, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+    """Returns one page of non-admin users in id order, and the cursor for the next page."""
+    User = models.User
+    query = select(User).where(User.role != 'admin')
+    if cursor is not None:
+        key = decode_cursor("users", cursor)
+        try:
+            (last_id,) = key
+            last_id = int(last_id)
+        except (ValueError, TypeError):
+            raise InvalidCursor("Malformed cursor")
+        query = query.where(User.id > last_id)
+    rows = db.scalars(query.order_by(User.id).limit(limit + 1)).all()
+    users = rows[:limit]
+    next_cursor = encode_cursor("users", [users[-1].id]) if len(rows) > limit else None
+    return users, next_cursor
+
+
+# --- Exports -----------------------------------------------------------------
+# An export walks the listing one keyset page at a time, opening a short-lived
+# session per page, so memory stays flat and no connection or read snapshot is
+# held open while the client downloads.
+
+async def iter_pages(session_scope, list_page, **filters):
+    """Yields successive pages from `list_page` (list_orders or list_users) until exhausted."""
+    cursor = None
+    while True:
+        async with session_scope() as db:
+            rows, cursor = await db.run_sync(list_page, limit=EXPORT_CHUNK_SIZE, cursor=cursor, **filters)
+        if rows:
+            yield rows
+        if cursor is None:
+            return
+
+
+def _csv_chunk(rows, columns, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([getattr(row, column) for column in columns])
+    return buffer.getvalue().encode()
+
+
+async def export_orders(session_scope, export_format: ExportFormat, **filters):
+    """Streams the matching orders as NDJSON (with line items) or CSV (one row per order)."""
+    if export_format == "csv":
+        yield _csv_chunk((), ORDER_CSV_COLUMNS, header=True)
+        async for orders in iter_pages(session_scope, list_orders, with_items=False, **filters):
+            yield _csv_chunk(orders, ORDER_CSV_COLUMNS, header=False)
+    else:
+        async for orders in iter_pages(session_scope, list_orders, **filters):
+            yield b"".join(
+                serialization.dump_json(schemas.OrderDetail, order) + b"\n"
+                for order in orders
+            )
+
+
+async def export_users(session_scope, export_format: ExportFormat):
+    """Streams every non-admin user as NDJSON or CSV, without password hashes."""
+    if export_format == "csv":
+        yield _csv_chunk((), USER_CSV_COLUMNS, header=True)
+        async for users in iter_pages(session_scope, list_users):
+            yield _csv_chunk(users, USER_CSV_COLUMNS, header=False)
+    else:
+        async for users in iter_pages(session_scope, list_users):
+            yield b"".join(
+                schemas.S_User.model_validate(user).model_dump_json(exclude={"password"}).encode() + b"\n"
+                for user in users
+            )
@@ -0,0 +1,49 @@
+"""
+Requests/sec of an admin-only endpoint with a legacy email-only token (one
+users lookup per request, as before the uid/role claims) versus a token with
+uid/role claims served from the principal cache.
+
+    python benchmarks/auth_bench.py --requests 2000
+"""
+import argparse
+import json
+import time
+
+from common import create_user, import_app
+
+from fastapi.testclient import TestClient
+
+
+def requests_per_second(client, headers, count: int) -> float:
+    client.get("/admin/cache/stats", headers=headers)
+    started = time.perf_counter()
+    for _ in range(count):
+        response = client.get("/admin/cache/stats", headers=headers)
+        assert response.status_code == 200, response.text
+    return round(count / (time.perf_counter() - started), 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    options = parser.parse_args()
+
+    main = import_app()
+    import auth
+    from database import SessionLocal
+
+    db = SessionLocal()
+    admin = create_user(db, "admin@example.com", role="admin")
+    legacy_token = auth.create_access_token({"sub": admin.email})
+    token = auth.create_user_token(admin)
+    db.close()
+
+    with TestClient(main.app) as client:
+        result = {
+            "requests": options.requests,
+            "legacy_token_rps": requests_per_second(
+                client, {"Authorization": f"Bearer {legacy_token}"}, options.requests),
+            "claims_token_rps": requests_per_second(
+                client, {"Authorization": f"Bearer {token}"}, options.requests),
+        }
+    print(json.dumps(result, indent=2))
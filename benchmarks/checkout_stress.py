@@ -0,0 +1,85 @@
+"""
+Fires hundreds of concurrent checkouts at one limited-stock item and verifies
+that it is never oversold. tests/test_checkout_stress.py runs it on a smaller scale.
+
+    python benchmarks/checkout_stress.py --shoppers 300 --stock 50
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+
+from common import import_app
+
+import httpx
+
+
+async def main_async(options) -> dict:
+    """Runs one stress round; `options` has shoppers, stock and quantity (units each shopper orders)."""
+    main = import_app()
+    import auth
+    import models
+    from database import SessionLocal
+
+    db = SessionLocal()
+    item = models.Item(name="Limited sneaker", description="d", price=100,
+                       quantity=options.stock, category="Men", image_name="x.jpg")
+    db.add(item)
+    db.commit()
+    # Users are inserted with a placeholder hash and given tokens directly, so
+    # the run measures checkout rather than bcrypt.
+    # Named after the item, so rounds can share a database.
+    emails = [f"shopper{i}.item{item.id}@example.com" for i in range(options.shoppers)]
+    db.execute(models.User.__table__.insert(), [
+        {"email": email, "full_name": "Shopper", "password": "x", "role": "consumer"} for email in emails
+    ])
+    users = db.query(models.User).filter(models.User.email.in_(emails)).all()
+    db.execute(models.Cart.__table__.insert(), [
+        {"user_id": user.id, "item_id": item.id, "quantity": options.quantity} for user in users
+    ])
+    db.commit()
+    tokens = [auth.create_user_token(user) for user in users]
+    db.close()
+
+    order = {"customer_name": "Shopper", "customer_phone": "1", "customer_address": "Street 1"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def place(token):
+            response = await client.post("/order", json=order, headers={"Authorization": f"Bearer {token}"})
+            return response.status_code
+
+        started = time.perf_counter()
+        statuses = Counter(await asyncio.gather(*(place(token) for token in tokens)))
+        elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    remaining = db.get(models.Item, item.id).quantity
+    sold = db.query(models.OrderItem).filter(models.OrderItem.item_id == item.id).count() * options.quantity
+    db.close()
+
+    expected_orders = min(options.shoppers, options.stock // options.quantity)
+    return {
+        "shoppers": options.shoppers,
+        "stock": options.stock,
+        "statuses": dict(statuses),
+        "remaining_stock": remaining,
+        "units_sold": sold,
+        "oversold": sold > options.stock or remaining < 0,
+        "consistent": sold + remaining == options.stock and statuses[200] == expected_orders,
+        "wall_s": round(elapsed, 3),
+        "orders_per_s": round(statuses[200] / elapsed, 1),
+        "checkouts_per_s": round(options.shoppers / elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shoppers", type=int, default=300)
+    parser.add_argument("--stock", type=int, default=50)
+    parser.add_argument("--quantity", type=int, default=1, help="units each shopper orders")
+    result = asyncio.run(main_async(parser.parse_args()))
+    print(json.dumps(result, indent=2))
+    if result["oversold"] or not result["consistent"]:
+        sys.exit(1)
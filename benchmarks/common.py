@@ -0,0 +1,149 @@
+"""Shared helpers for the benchmark scripts in this directory."""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+WORDS = (
+    "classic slim fit cotton linen denim leather silk wool summer winter casual "
+    "formal vintage oversized cropped striped floral printed plain knit shirt "
+    "jacket dress skirt trousers jeans scarf belt watch bag wallet sneakers boots "
+    "sandals hat cap sunglasses bracelet necklace ring blue black white red green"
+).split()
+CATEGORIES = ["Men", "Women", "Accessories"]
+
+
+def _brand_names(count: int, seed: int = 1) -> list[str]:
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ra", "te", "vo", "zu", "ne", "sa", "di", "po", "ber", "lin", "tor"]
+    return sorted({"".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(count)})
+
+
+# A long tail of rare tokens, so searches are selective the way real ones are.
+BRANDS = _brand_names(5000)
+
+
+def temp_sqlite_url(name: str = "bench.db") -> str:
+    """Returns a URL for a fresh SQLite file in a throwaway directory."""
+    return f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='loja-bench-'), name)}"
+
+
+def import_app():
+    """
+    Imports main with a throwaway working directory, so the app's SQLite file
+    and images folder are created there instead of in the repository. Later
+    calls (several checks in one test run) return the same app.
+    """
+    if "main" in sys.modules:
+        return sys.modules["main"]
+    os.chdir(tempfile.mkdtemp(prefix="loja-app-"))
+    import logging
+    logging.disable(logging.WARNING)
+    import main
+    return main
+
+
+def create_user(db, email: str, role: str = "consumer", password: str = "password"):
+    import auth
+    import models
+    user = models.User(email=email, full_name=email.split("@")[0], password=auth.get_password_hash(password), role=role)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def seed_items(engine, count: int, seed: int = 42, batch_size: int = 10_000) -> None:
+    """Bulk-inserts `count` random items with a single executemany per batch."""
+    rng = random.Random(seed)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for start in range(0, count, batch_size):
+            rows = []
+            for _ in range(min(batch_size, count - start)):
+                name = f"{rng.choice(BRANDS)} {' '.join(rng.choices(WORDS, k=2))}"
+                description = " ".join(rng.choices(WORDS, k=12))
+                rows.append((
+                    f"{name}.jpg", name, description,
+                    rng.randint(5, 500), rng.randint(0, 50), rng.choice(CATEGORIES),
+                ))
+            cursor.executemany(
+                "INSERT INTO items (image_name, name, description, price, quantity, category) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def seed_orders(engine, count: int, customer_id: int, item_id: int, seed: int = 7, batch_size: int = 50_000,
+                customers: int = 1, items: int = 1) -> None:
+    """
+    Bulk-inserts `count` orders spread over two years, each with one line item,
+    after any orders already there. Orders are spread over customer ids
+    customer_id .. customer_id + customers - 1 and item ids item_id .. item_id + items - 1.
+    """
+    rng = random.Random(seed)
+    start_date = datetime(2024, 1, 1)
+    statuses = ["pending", "shipped", "completed", "cancelled"]
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        first_id = cursor.execute("SELECT coalesce(max(id), 0) FROM orders").fetchone()[0]
+        for start in range(0, count, batch_size):
+            orders, lines = [], []
+            for n in range(start + 1, min(start + batch_size, count) + 1):
+                order_id = first_id + n
+                placed = start_date + timedelta(seconds=n * 63_072_000 // count)
+                amount = rng.randint(5, 500)
+                orders.append((
+                    order_id, f"Customer {n % 997}", "555-0100", f"{n} Main Street",
+                    rng.choice(statuses), placed.isoformat(sep=" "), amount, customer_id + n % customers,
+                ))
+                lines.append((order_id, item_id + n % items, 1, amount))
+            cursor.executemany(
+                "INSERT INTO orders (id, customer_name, customer_phone, customer_address, status, "
+                "order_date, total_amount, customer_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                orders,
+            )
+            cursor.executemany(
+                "INSERT INTO order_items (order_id, item_id, quantity, price) VALUES (?, ?, ?, ?)", lines,
+            )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def time_calls(fn, args_list) -> list[float]:
+    """Calls fn(*args) for each entry and returns the latencies in milliseconds."""
+    latencies = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summarize(latencies_ms: list[float]) -> dict:
+    ordered = sorted(latencies_ms)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1], 3),
+    }
@@ -0,0 +1,155 @@
+"""
+Measures peak memory and time-to-first-byte of the admin order export against
+the old load-everything listing, on a large order table.
+
+    python benchmarks/export_bench.py --orders 1000000
+
+Each measurement runs in its own process so their peak memory is not shared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from common import create_user, import_app, seed_orders, temp_sqlite_url
+
+
+def rss_mb(field: str = "VmRSS") -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def heap_mb() -> float:
+    # Anonymous memory only: SQLite's mmap of the database file also counts
+    # towards RSS but is page cache the kernel can drop, not memory we hold.
+    return rss_mb("RssAnon")
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def request_asgi(app, path: str, query: str, headers: dict) -> dict:
+    """Calls the ASGI app directly, timestamping the first body chunk as it is sent."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "server": ("bench", 80), "client": ("127.0.0.1", 1),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+    done = asyncio.Event()
+    requested = False
+    result = {"status": None, "ttfb_s": None, "bytes": 0, "peak_heap_mb": heap_mb()}
+    started = time.perf_counter()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if result["ttfb_s"] is None:
+                result["ttfb_s"] = round(time.perf_counter() - started, 4)
+            result["bytes"] += len(message["body"])
+            result["peak_heap_mb"] = max(result["peak_heap_mb"], heap_mb())
+
+    await app(scope, receive, send)
+    done.set()
+    result["total_s"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def measure(mode: str, export_format: str) -> dict:
+    main = import_app()
+    import auth
+    import models
+    import schemas
+    from database import SessionLocal
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+
+    db = SessionLocal()
+    admin = db.get(models.User, 1)
+    db.close()
+    token = auth.create_user_token(admin)
+    baseline = heap_mb()
+
+    if mode == "stream":
+        result = asyncio.run(request_asgi(
+            main.app, "/admin/orders/export", f"format={export_format}",
+            {"Authorization": f"Bearer {token}"},
+        ))
+    else:
+        # What GET /admin/orders used to do: load every order and its lines,
+        # then serialize one JSON list; nothing is sent until all of it is built.
+        started = time.perf_counter()
+        db = SessionLocal()
+        orders = db.scalars(select(models.Order).options(selectinload(models.Order.items))).all()
+        body = TypeAdapter(list[schemas.OrderDetail]).dump_json(orders)
+        db.close()
+        elapsed = round(time.perf_counter() - started, 3)
+        result = {"status": 200, "ttfb_s": elapsed, "bytes": len(body), "total_s": elapsed, "peak_heap_mb": heap_mb()}
+
+    result.update(mode=mode, format=export_format if mode == "stream" else "json",
+                  baseline_heap_mb=round(baseline, 1), peak_heap_mb=round(result["peak_heap_mb"], 1),
+                  peak_rss_mb=round(peak_rss_mb(), 1))
+    return result
+
+
+def seed(orders: int):
+    main = import_app()
+    from database import SessionLocal
+
+    db = SessionLocal()
+    admin = create_user(db, "admin@example.com", role="admin")
+    item = main.models.Item(name="Bench item", description="d", price=10, quantity=1,
+                            category="Men", image_name="x.jpg")
+    db.add(item)
+    db.commit()
+    seed_orders(main.engine, orders, customer_id=admin.id, item_id=item.id)
+    db.close()
+
+
+def run_child(*args) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), *args],
+        check=True, capture_output=True, text=True, env=os.environ,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="don't run the load-everything comparison (it needs several GB at 1M orders)")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "FORMAT"), help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        print(json.dumps(measure(*options.child)))
+        sys.exit(0)
+
+    os.environ["DATABASE_URL"] = temp_sqlite_url()
+    started = time.perf_counter()
+    seed(options.orders)
+    results = {"orders": options.orders, "seed_s": round(time.perf_counter() - started, 1), "runs": []}
+    for export_format in ("ndjson", "csv"):
+        results["runs"].append(run_child("--child", "stream", export_format))
+    if not options.skip_legacy:
+        results["runs"].append(run_child("--child", "legacy", "json"))
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,73 @@
+"""
+Measures image variant generation throughput with 1..N worker processes.
+
+    python benchmarks/image_bench.py --images 40 --size 2400x1600 --workers 1,2,4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import common  # noqa: F401  (puts the repository on sys.path)
+
+import imaging
+from PIL import Image
+
+
+def make_photos(directory: str, count: int, width: int, height: int) -> list[str]:
+    """Writes photo-like JPEGs (noise over a gradient), which compress like real pictures."""
+    names = []
+    gradient = Image.linear_gradient("L").resize((width, height))
+    for i in range(count):
+        noise = Image.effect_noise((width, height), 40 + i % 20)
+        photo = Image.merge("RGB", (gradient, noise, gradient.rotate(180)))
+        name = f"photo{i}.jpg"
+        photo.save(os.path.join(directory, name), "JPEG", quality=90)
+        names.append(name)
+    return names
+
+
+def run(names, directory: str, workers: int) -> dict:
+    for entry in os.listdir(directory):
+        if entry.count(".") == 2:  # <stem>.<variant>.<ext> from a previous run
+            os.remove(os.path.join(directory, entry))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pool.submit(int).result()  # start the workers before timing
+        started = time.perf_counter()
+        written = sum(pool.map(imaging.generate_variants, names, [directory] * len(names)))
+        elapsed = time.perf_counter() - started
+    return {
+        "workers": workers,
+        "images": len(names),
+        "variants": written,
+        "wall_s": round(elapsed, 2),
+        "images_per_s": round(len(names) / elapsed, 2),
+        "images_per_s_per_worker": round(len(names) / elapsed / workers, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--size", default="2400x1600", help="source image size, WIDTHxHEIGHT")
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, os.cpu_count() or 1})))
+    options = parser.parse_args()
+
+    width, height = (int(n) for n in options.size.split("x"))
+    directory = tempfile.mkdtemp(prefix="loja-images-")
+    names = make_photos(directory, options.images, width, height)
+    source_mb = sum(os.path.getsize(os.path.join(directory, name)) for name in names) / 1e6
+    results = [run(names, directory, int(n)) for n in options.workers.split(",")]
+    variant_kb = {
+        f"{variant}.{imaging.FILE_EXTENSIONS[fmt]}": round(
+            os.path.getsize(os.path.join(directory, imaging.variant_name(names[0], variant, fmt))) / 1024, 1)
+        for variant in imaging.VARIANT_SIZES for fmt in imaging.VARIANT_FORMATS
+    }
+    print(json.dumps({
+        "cpu_count": os.cpu_count(),
+        "source": {"size": options.size, "avg_kb": round(source_mb * 1000 / len(names), 1)},
+        "variant_kb": variant_kb,
+        "runs": results,
+    }, indent=2))
@@ -0,0 +1,118 @@
+"""
+Bulk catalog import throughput (rows/s) for new items and for updates,
+against one commit per item as POST /admin/create/items does it.
+
+    python benchmarks/import_bench.py --rows 100000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import CATEGORIES, WORDS, temp_sqlite_url
+
+os.environ["DATABASE_URL"] = temp_sqlite_url()
+
+import catalog_import  # noqa: E402
+import imaging  # noqa: E402
+import models  # noqa: E402
+import search  # noqa: E402
+import stats  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+
+# Rows share this many images, as products in a catalog share photos.
+IMAGES = 100
+
+
+def write_images(directory: str) -> None:
+    """Imported rows must name existing files in images/; these are placeholders."""
+    os.makedirs(os.path.join(directory, imaging.IMAGES_DIR), exist_ok=True)
+    for n in range(IMAGES):
+        with open(os.path.join(directory, imaging.IMAGES_DIR, f"{n:064x}.jpg"), "wb") as image:
+            image.write(b"\xff\xd8\xff\xd9")
+
+
+def write_file(path: str, import_format: str, rows: int, with_ids: bool, seed: int = 3) -> None:
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out) if import_format == "csv" else None
+        if writer:
+            writer.writerow(["id", "name", "description", "price", "quantity", "category", "image_name"])
+        for n in range(1, rows + 1):
+            row = {
+                "id": n if with_ids else None,
+                "name": " ".join(rng.choices(WORDS, k=3)),
+                "description": " ".join(rng.choices(WORDS, k=12)),
+                "price": rng.randint(5, 500),
+                "quantity": rng.randint(0, 50),
+                "category": rng.choice(CATEGORIES),
+                "image_name": f"{n % IMAGES:064x}.jpg",
+            }
+            if writer:
+                writer.writerow(["" if value is None else value for value in row.values()])
+            else:
+                out.write(json.dumps(row) + "\n")
+
+
+def timed_import(path: str, import_format: str, batch_size: int) -> dict:
+    started = time.perf_counter()
+    with open(path, "rb") as source:
+        report = catalog_import.import_file(source, import_format, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    assert report["failed"] == 0, report["errors"]
+    return {
+        "created": report["created"],
+        "updated": report["updated"],
+        "seconds": round(elapsed, 2),
+        "rows_per_s": round(report["rows"] / elapsed),
+    }
+
+
+def one_commit_per_item(rows: int) -> dict:
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        for n in range(rows):
+            item = models.Item(name=f"single {n}", description="d", price=10, quantity=1,
+                               category="Men", image_name=f"single{n}.jpg")
+            db.add(item)
+            stats.record_item_created(db)
+            db.commit()
+            db.refresh(item)
+    elapsed = time.perf_counter() - started
+    return {"rows": rows, "seconds": round(elapsed, 2), "rows_per_s": round(rows / elapsed)}
+
+
+def main(rows: int, batch_size: int, baseline_rows: int) -> dict:
+    models.Base.metadata.create_all(bind=engine)
+    search.install_fts(engine)  # its triggers are part of the cost of every insert
+    stats.ensure_initialized(engine)
+    directory = tempfile.mkdtemp(prefix="loja-import-")
+    write_images(directory)
+    os.chdir(directory)
+    results = {"rows": rows, "batch_size": batch_size}
+    for import_format in ("csv", "ndjson"):
+        new_path = os.path.join(directory, f"new.{import_format}")
+        keyed_path = os.path.join(directory, f"keyed.{import_format}")
+        write_file(new_path, import_format, rows, with_ids=False)
+        write_file(keyed_path, import_format, rows, with_ids=True, seed=4)
+        with engine.begin() as conn:
+            conn.execute(models.Item.__table__.delete())
+        results[import_format] = {
+            "create": timed_import(new_path, import_format, batch_size),
+            # The same ids again: every row is an update.
+            "update": timed_import(keyed_path, import_format, batch_size),
+        }
+    results["one_commit_per_item"] = one_commit_per_item(baseline_rows)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=catalog_import.IMPORT_BATCH_SIZE)
+    parser.add_argument("--baseline-rows", type=int, default=2000)
+    options = parser.parse_args()
+    print(json.dumps(main(options.rows, options.batch_size, options.baseline_rows), indent=2))
@@ -0,0 +1,130 @@
+"""
+Background job queue throughput and latency: the cost of enqueue() inside a
+request's transaction, how fast a worker pool drains a backlog, and how long a
+job waits between its commit and its completion when workers are idle.
+
+    python benchmarks/jobs_bench.py --jobs 5000 --workers 1,2,4 --handler-ms 0,5
+"""
+import argparse
+import json
+import os
+import time
+
+from common import summarize, temp_sqlite_url
+
+os.environ["DATABASE_URL"] = temp_sqlite_url()
+
+import jobs  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+from sqlalchemy import delete, func, select  # noqa: E402
+
+# Stand-in handlers: one does nothing, the other blocks like an SMTP call would.
+handler_delay = {"seconds": 0.0}
+
+
+@jobs.handler("bench.noop")
+def noop(session, payload):
+    if handler_delay["seconds"]:
+        time.sleep(handler_delay["seconds"])
+
+
+def reset():
+    with SessionLocal() as session:
+        session.execute(delete(models.Job))
+        session.commit()
+
+
+def remaining() -> int:
+    with SessionLocal() as session:
+        return session.scalar(select(func.count()).select_from(models.Job).where(models.Job.status != "done"))
+
+
+def bench_enqueue(count: int) -> dict:
+    """One job per transaction, as a request queues it, and many per transaction."""
+    reset()
+    latencies = []
+    with SessionLocal() as session:
+        for n in range(count):
+            started = time.perf_counter()
+            jobs.enqueue(session, "bench.noop", {"n": n}, key=f"single:{n}")
+            session.commit()
+            latencies.append((time.perf_counter() - started) * 1000)
+    # enqueue() alone, without the commit it rides on.
+    insert_only = []
+    with SessionLocal() as session:
+        for n in range(count):
+            started = time.perf_counter()
+            jobs.enqueue(session, "bench.noop", {"n": n}, key=f"batch:{n}")
+            insert_only.append((time.perf_counter() - started) * 1000)
+        session.commit()
+    return {
+        "enqueue_and_commit": summarize(latencies),
+        "enqueue_in_open_transaction": summarize(insert_only),
+    }
+
+
+def bench_drain(count: int, workers: int, delay: float) -> dict:
+    """Time for `workers` threads to run a backlog of `count` jobs."""
+    reset()
+    with SessionLocal() as session:
+        for n in range(count):
+            jobs.enqueue(session, "bench.noop", {"n": n})
+        session.commit()
+    handler_delay["seconds"] = delay
+    pool = jobs.WorkerPool(workers, poll_interval=0.05)
+    started = time.perf_counter()
+    pool.start()
+    while remaining():
+        time.sleep(0.02)
+    elapsed = time.perf_counter() - started
+    pool.stop()
+    return {"jobs": count, "seconds": round(elapsed, 3), "jobs_per_s": round(count / elapsed, 1)}
+
+
+def bench_latency(count: int, workers: int) -> dict:
+    """Commit-to-finish time of single jobs queued while the workers are idle."""
+    reset()
+    handler_delay["seconds"] = 0
+    # A long poll interval, so the numbers show the wake-up on commit rather than polling.
+    pool = jobs.WorkerPool(workers, poll_interval=5)
+    pool.start()
+    latencies = []
+    with SessionLocal() as session:
+        for n in range(count):
+            started = time.perf_counter()
+            jobs.enqueue(session, "bench.noop", {"n": n})
+            session.commit()
+            while remaining():
+                time.sleep(0.0005)
+            latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+    pool.stop()
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=5000)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--handler-ms", default="0,5", help="simulated work per job")
+    parser.add_argument("--latency-samples", type=int, default=200)
+    options = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    worker_counts = [int(n) for n in options.workers.split(",")]
+    results = {
+        "enqueue": bench_enqueue(min(options.jobs, 2000)),
+        "drain": {
+            f"{ms}ms_handler": {
+                f"{workers}_workers": bench_drain(options.jobs, workers, float(ms) / 1000) for workers in worker_counts
+            }
+            for ms in options.handler_ms.split(",")
+        },
+        "commit_to_done": bench_latency(options.latency_samples, worker_counts[0]),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
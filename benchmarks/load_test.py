@@ -0,0 +1,344 @@
+"""
+Drives a realistic traffic mix against every main user-facing route and
+reports throughput and latency percentiles per route as JSON.
+
+    python benchmarks/load_test.py --target inprocess --duration 30 --concurrency 32
+    python benchmarks/load_test.py --target uvicorn --output run.json
+    python benchmarks/load_test.py --target uvicorn --workers 4
+    python benchmarks/load_test.py --target both --compare baseline.json
+
+Each run seeds a fresh SQLite database (--users, --items, --orders, --carts).
+"inprocess" calls the ASGI app directly through httpx; "uvicorn" starts a
+local server through serve.py, with --workers processes, and goes over TCP.
+With --compare, routes whose p95
+latency rose or whose throughput fell by more than --tolerance are listed
+and the exit status is 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from common import ROOT, WORDS, seed_items, seed_orders, summarize, temp_sqlite_url
+
+import httpx
+
+# (weight, scenario name); scenarios are the methods of Shopper below.
+TRAFFIC_MIX = [
+    (30, "browse"),
+    (15, "view_item"),
+    (15, "search"),
+    (2, "login"),
+    (5, "profile"),
+    (10, "add_to_cart"),
+    (8, "view_cart"),
+    (4, "checkout"),
+    (4, "order_history"),
+    (2, "admin_stats"),
+    (2, "admin_orders"),
+]
+PASSWORD = "password"
+SORTS = ["newest", "oldest", "price_asc", "price_desc"]
+CATEGORIES = [None, "Men", "Women", "Accessories"]
+
+
+def seed(options) -> dict:
+    """Creates the schema and the data set; returns what the traffic needs (users, tokens, item ids)."""
+    import auth
+    import models
+    import search
+    import stats
+    from database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    search.install_fts(engine)
+
+    seed_items(engine, options.items)
+    # One real bcrypt hash shared by every user, so /token does real work.
+    password_hash = auth.get_password_hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [
+            {"email": "admin@example.com", "full_name": "Admin", "password": password_hash, "role": "admin"},
+            *({"email": f"user{n}@example.com", "full_name": f"User {n}", "password": password_hash,
+               "role": "consumer"} for n in range(options.users)),
+        ])
+    db = SessionLocal()
+    try:
+        users = db.query(models.User).order_by(models.User.id).all()
+        admin, shoppers = users[0], users[1:]
+        if options.orders:
+            seed_orders(engine, options.orders, customer_id=shoppers[0].id, item_id=1,
+                        customers=len(shoppers), items=options.items)
+        rng = random.Random(options.seed)
+        db.execute(models.Cart.__table__.insert(), [
+            {"user_id": user.id, "item_id": item_id, "quantity": 1}
+            for user in shoppers[:options.carts]
+            for item_id in rng.sample(range(1, options.items + 1), 3)
+        ])
+        stats.rebuild(db)
+        db.commit()
+        return {
+            "admin": auth.create_user_token(admin),
+            "shoppers": [(user.email, auth.create_user_token(user)) for user in shoppers],
+        }
+    finally:
+        db.close()
+
+
+class Shopper:
+    """One simulated client: picks a scenario by weight, runs it, repeats."""
+
+    def __init__(self, client: httpx.AsyncClient, data: dict, items: int, rng: random.Random, record):
+        self.client = client
+        self.items = items
+        self.rng = rng
+        self.record = record
+        self.email, token = rng.choice(data["shoppers"])
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.admin_headers = {"Authorization": f"Bearer {data['admin']}"}
+        self.scenarios = [getattr(self, name) for _, name in TRAFFIC_MIX]
+        self.weights = [weight for weight, _ in TRAFFIC_MIX]
+
+    async def request(self, route: str, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        self.record(route, (time.perf_counter() - started) * 1000, status)
+        return response
+
+    async def run_once(self):
+        await self.rng.choices(self.scenarios, self.weights)[0]()
+
+    async def browse(self):
+        params = {"sort": self.rng.choice(SORTS), "limit": 20}
+        category = self.rng.choice(CATEGORIES)
+        route = "GET /items"
+        if category:
+            params["category"] = category
+        response = await self.request(route, "GET", "/items", params=params)
+        # Half the visitors look at the next page too.
+        if response is not None and response.status_code == 200 and self.rng.random() < 0.5:
+            cursor = response.json().get("next_cursor")
+            if cursor:
+                await self.request(route, "GET", "/items", params={**params, "cursor": cursor})
+
+    async def view_item(self):
+        await self.request("GET /items/{item_id}", "GET", f"/items/{self.rng.randint(1, self.items)}")
+
+    async def search(self):
+        query = " ".join(self.rng.sample(WORDS, self.rng.choice([1, 2])))
+        await self.request("GET /search/items", "GET", "/search/items", params={"q": query})
+
+    async def login(self):
+        await self.request("POST /token", "POST", "/token", data={"username": self.email, "password": PASSWORD})
+
+    async def profile(self):
+        await self.request("GET /users/me", "GET", "/users/me", headers=self.headers)
+
+    async def add_to_cart(self):
+        await self.request("POST /user/cart", "POST", "/user/cart", headers=self.headers,
+                           json={"item_id": self.rng.randint(1, self.items), "quantity": 1})
+
+    async def view_cart(self):
+        await self.request("GET /user/cart", "GET", "/user/cart", headers=self.headers)
+
+    async def checkout(self):
+        await self.request("POST /user/cart", "POST", "/user/cart", headers=self.headers,
+                           json={"item_id": self.rng.randint(1, self.items), "quantity": 1})
+        # 400 (empty cart) and 409 (out of stock) are normal outcomes here.
+        await self.request("POST /order", "POST", "/order", headers=self.headers, json={
+            "customer_name": "Load Test", "customer_phone": "555-0100", "customer_address": "1 Main Street"})
+
+    async def order_history(self):
+        await self.request("GET /user/orders", "GET", "/user/orders", headers=self.headers)
+
+    async def admin_stats(self):
+        await self.request("GET /admin/stats", "GET", "/admin/stats", headers=self.admin_headers)
+
+    async def admin_orders(self):
+        await self.request("GET /admin/orders", "GET", "/admin/orders", headers=self.admin_headers)
+
+
+async def drive(client: httpx.AsyncClient, data: dict, options) -> dict:
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    measuring = False
+
+    def record(route, elapsed_ms, status):
+        if measuring:
+            latencies[route].append(elapsed_ms)
+            statuses[route][str(status)] += 1
+
+    async def worker(index, deadline):
+        shopper = Shopper(client, data, options.items, random.Random(options.seed * 1000 + index), record)
+        while time.perf_counter() < deadline:
+            await shopper.run_once()
+
+    warmup_end = time.perf_counter() + options.warmup
+    await asyncio.gather(*(worker(i, warmup_end) for i in range(options.concurrency)))
+    measuring = True
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i, started + options.duration) for i in range(options.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for route in sorted(latencies):
+        counts = statuses[route]
+        errors = sum(count for status, count in counts.items() if not status.isdigit() or int(status) >= 500)
+        routes[route] = {
+            "rps": round(len(latencies[route]) / elapsed, 2),
+            "errors": errors,
+            "statuses": dict(sorted(counts.items())),
+            **summarize(latencies[route]),
+        }
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "total": {
+            "requests": total,
+            "rps": round(total / elapsed, 2),
+            "errors": sum(route["errors"] for route in routes.values()),
+            **summarize([value for values in latencies.values() for value in values]),
+        },
+        "routes": routes,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_up(base_url: str, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+            try:
+                await client.get("/")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not start in time")
+
+
+async def run_target(options) -> dict:
+    data = seed(options)
+    limits = httpx.Limits(max_connections=options.concurrency, max_keepalive_connections=options.concurrency)
+    if options.target == "inprocess":
+        from common import import_app
+        main = import_app()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            return await drive(client, data, options)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "serve.py"), "--workers", str(options.workers), "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=tempfile.mkdtemp(prefix="loja-app-"),
+        env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    try:
+        await wait_until_up(base_url, server)
+        async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+            return await drive(client, data, options)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def run_in_child(options, target: str) -> dict:
+    """Runs one target in a fresh interpreter, so each gets its own database and app instance."""
+    args = [sys.executable, os.path.abspath(__file__), "--target", target]
+    for name in ("users", "items", "orders", "carts", "concurrency", "duration", "warmup", "seed", "workers"):
+        args += [f"--{name}", str(getattr(options, name))]
+    output = subprocess.run(args, check=True, capture_output=True, text=True, env=os.environ).stdout
+    return json.loads(output)["targets"][target]
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Routes whose p95 latency rose, or whose throughput fell, by more than `tolerance`."""
+    regressions = []
+    for target, result in results["targets"].items():
+        before_routes = baseline.get("targets", {}).get(target, {}).get("routes", {})
+        for route, after in result["routes"].items():
+            before = before_routes.get(route)
+            if not before:
+                continue
+            if after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append({"target": target, "route": route, "metric": "p95_ms",
+                                    "baseline": before["p95_ms"], "current": after["p95_ms"]})
+            if after["rps"] < before["rps"] * (1 - tolerance):
+                regressions.append({"target": target, "route": route, "metric": "rps",
+                                    "baseline": before["rps"], "current": after["rps"]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["inprocess", "uvicorn", "both"], default="inprocess")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=20_000)
+    parser.add_argument("--carts", type=int, default=200, help="users whose cart starts with 3 items")
+    parser.add_argument("--concurrency", type=int, default=32, help="simulated clients")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds per target")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before each run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="server processes for the uvicorn target")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="a previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change (default 0.2)")
+    options = parser.parse_args()
+
+    report = {
+        "scale": {name: getattr(options, name) for name in ("users", "items", "orders", "carts")},
+        "concurrency": options.concurrency,
+        "workers": options.workers,
+        "duration_s": options.duration,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "db_mode": os.getenv("DB_MODE", "async"),
+        },
+        "targets": {},
+    }
+    if options.target == "both":
+        for target in ("inprocess", "uvicorn"):
+            report["targets"][target] = run_in_child(options, target)
+    else:
+        os.environ["DATABASE_URL"] = temp_sqlite_url("load.db")
+        os.environ.setdefault("IMAGE_VARIANTS_ENABLED", "false")
+        # Every simulated client shares one IP, which the rate limits would throttle.
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        report["targets"][options.target] = asyncio.run(run_target(options))
+
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as baseline:
+            report["regressions"] = compare(report, json.load(baseline), options.tolerance)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as out:
+            out.write(text + "\n")
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
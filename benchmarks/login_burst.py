@@ -0,0 +1,77 @@
+"""
+p50/p99 latency of GET /items while a burst of logins is in flight, driven
+in-process over ASGI.
+
+    python benchmarks/login_burst.py --logins 50 --browsers 200
+
+--inline-bcrypt runs password verification directly on the event loop, the
+way /token worked before hashing moved to auth's thread pool, for comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("CATALOG_CACHE_ENABLED", "false")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from common import create_user, import_app, seed_items, summarize
+
+import httpx
+
+
+async def main_async(options):
+    main = import_app()
+    import auth
+    from database import SessionLocal
+
+    if options.inline_bcrypt:
+        async def inline_verify(plain, hashed):
+            return auth.pwd_context.verify_and_update(plain, hashed)
+        auth.averify_and_update = inline_verify
+
+    db = SessionLocal()
+    create_user(db, "shopper@example.com")
+    db.close()
+    seed_items(main.engine, 2000)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies = []
+
+        async def browse():
+            started = time.perf_counter()
+            response = await client.get("/items")
+            assert response.status_code == 200
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        async def login():
+            response = await client.post(
+                "/token", data={"username": "shopper@example.com", "password": "password"})
+            assert response.status_code == 200
+
+        await browse()
+        latencies.clear()
+        started = time.perf_counter()
+        tasks = [login() for _ in range(options.logins)]
+        for _ in range(options.browsers):
+            tasks.append(browse())
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "mode": "inline-bcrypt" if options.inline_bcrypt else "hash-pool",
+        "logins": options.logins,
+        "items_requests": options.browsers,
+        "wall_s": round(elapsed, 3),
+        "items_latency": summarize(latencies),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--browsers", type=int, default=200)
+    parser.add_argument("--inline-bcrypt", action="store_true")
+    print(json.dumps(asyncio.run(main_async(parser.parse_args())), indent=2))
@@ -0,0 +1,207 @@
+"""
+Checks that every endpoint in main.py runs a bounded number of SQL statements,
+whatever the amount of data involved. Each scenario runs at two data sizes; the
+script exits non-zero if a request exceeds its budget or its statement count
+grows with the data. tests/test_query_budget.py runs the same check.
+
+    python benchmarks/query_budget.py
+"""
+import os
+import sys
+
+os.environ["CATALOG_CACHE_ENABLED"] = "false"
+os.environ["IMAGE_VARIANTS_ENABLED"] = "false"
+# Job workers and the cache invalidation listener would run their own
+# statements while requests are being counted.
+os.environ["JOB_WORKERS"] = "0"
+os.environ["INVALIDATION_POLL_INTERVAL"] = "0"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+from common import create_user, import_app, seed_items
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+# (method, path, statement budget)
+BUDGETS = {
+    "GET /users/me": 1,
+    "POST /register": 4,
+    "POST /token": 2,
+    "POST /admin/create/items": 4,
+    "GET /items": 1,
+    "GET /items/men": 1,
+    "GET /items/{item_id}": 1,
+    "GET /items (If-None-Match)": 0,
+    # Checks the item exists before answering 304 (free when it is cached).
+    "GET /items/{item_id} (If-None-Match)": 1,
+    "GET /search/items": 1,
+    "POST /user/cart": 1,
+    "POST /user/cart/batch": 5,
+    "PUT /user/cart/items/{item_id}": 3,
+    "GET /user/cart": 1,
+    "DELETE /user/cart/{cart_item_id}": 2,
+    "POST /order": 10,
+    "POST /order (Idempotency-Key)": 13,
+    "POST /order (replay)": 1,
+    "GET /user/orders": 2,
+    "GET /user/order/items/{order_id}": 2,
+    "GET /admin/stats": 1,
+    "GET /admin/stats/series": 1,
+    "GET /admin/cache/stats": 0,
+    "GET /admin/orders": 2,
+    "GET /admin/orders/export": 2,
+    "GET /admin/users": 1,
+    "GET /admin/users/export": 1,
+    "GET /admin/order/items/{order_id}": 1,
+    "POST /admin/order/{order_id}": 6,
+    "GET /admin/jobs": 3,
+}
+
+
+class StatementCounter:
+    def __init__(self, engines):
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def start(self, key):
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def setup():
+    main = import_app()
+    import database
+
+    seed_items(main.engine, 100)
+    engines = [database.engine] + ([database.async_engine.sync_engine] if database.async_engine else [])
+    return main, StatementCounter(engines)
+
+
+def run_scenario(main, counter, lines: int) -> dict:
+    """Runs every endpoint once for a shopper whose cart and order history have `lines` rows."""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    admin = create_user(db, f"admin{lines}@example.com", role="admin")
+    shopper = create_user(db, f"shopper{lines}@example.com")
+    db.close()
+    counts = {}
+
+    with TestClient(main.app) as client:
+        def login(email):
+            response = client.post("/token", data={"username": email, "password": "password"})
+            return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        admin_headers = login(admin.email)
+        shopper_headers = login(shopper.email)
+        # Warm the principal cache so auth costs nothing, as on the hot path.
+        client.get("/users/me", headers=admin_headers)
+        client.get("/users/me", headers=shopper_headers)
+
+        def measure(key, method, url, **kwargs):
+            counter.start(key)
+            response = client.request(method, url, **kwargs)
+            assert response.status_code < 400, (key, response.status_code, response.text)
+            counts[key] = counter.count
+            return response
+
+        measure("GET /users/me", "GET", "/users/me", headers=shopper_headers)
+        measure("POST /register", "POST", "/register", json={
+            "email": f"new{lines}@example.com", "full_name": "New", "password": "pw", "confirmPassword": "pw"})
+        measure("POST /token", "POST", "/token", data={"username": shopper.email, "password": "password"})
+        measure("POST /admin/create/items", "POST", "/admin/create/items", headers=admin_headers, data={
+            "name": "Linen shirt", "description": "d", "price": 10, "quantity": 5, "category": "Men",
+        }, files={"file": ("shirt.png", b"\x89PNG\r\n\x1a\n" + b"\0" * 64, "image/png")})
+        etag = measure("GET /items", "GET", "/items", params={"limit": 100}).headers["ETag"]
+        measure("GET /items/men", "GET", "/items/men")
+        measure("GET /items/{item_id}", "GET", "/items/1")
+        measure("GET /items (If-None-Match)", "GET", "/items", params={"limit": 100},
+                headers={"If-None-Match": etag})
+        measure("GET /items/{item_id} (If-None-Match)", "GET", "/items/1", headers={"If-None-Match": etag})
+        measure("GET /search/items", "GET", "/search/items", params={"q": "shirt"})
+
+        for item_id in range(1, lines + 1):
+            measure("POST /user/cart", "POST", "/user/cart", headers=shopper_headers,
+                    json={"item_id": item_id, "quantity": 1})
+        measure("POST /user/cart/batch", "POST", "/user/cart/batch", headers=shopper_headers, json={"operations": [
+            *({"item_id": item_id, "quantity": 1} for item_id in range(1, lines + 1)),
+            *({"item_id": item_id, "quantity": 2, "mode": "set"} for item_id in range(lines + 1, 2 * lines + 1)),
+            {"item_id": 2 * lines + 1, "quantity": 0, "mode": "set"},
+        ]})
+        measure("PUT /user/cart/items/{item_id}", "PUT", f"/user/cart/items/{lines + 1}", headers=shopper_headers,
+                json={"quantity": 0})
+        measure("GET /user/cart", "GET", "/user/cart", headers=shopper_headers)
+        cart_id = client.get("/user/cart", headers=shopper_headers).json()[-1]["id"]
+        measure("DELETE /user/cart/{cart_item_id}", "DELETE", f"/user/cart/{cart_id}", headers=shopper_headers)
+        client.post("/user/cart", headers=shopper_headers, json={"item_id": lines, "quantity": 1})
+
+        order = {"customer_name": "Shopper", "customer_phone": "1", "customer_address": "Street 1"}
+        order_id = measure("POST /order", "POST", "/order", headers=shopper_headers, json=order).json()["id"]
+        client.post("/user/cart", headers=shopper_headers, json={"item_id": 1, "quantity": 1})
+        keyed_headers = {**shopper_headers, "Idempotency-Key": f"order-{lines}"}
+        measure("POST /order (Idempotency-Key)", "POST", "/order", headers=keyed_headers, json=order)
+        measure("POST /order (replay)", "POST", "/order", headers=keyed_headers, json=order)
+        for _ in range(lines - 1):
+            client.post("/user/cart", headers=shopper_headers, json={"item_id": 1, "quantity": 1})
+            client.post("/order", headers=shopper_headers, json=order)
+
+        measure("GET /user/orders", "GET", "/user/orders", headers=shopper_headers)
+        measure("GET /user/order/items/{order_id}", "GET", f"/user/order/items/{order_id}", headers=shopper_headers)
+        measure("GET /admin/stats", "GET", "/admin/stats", headers=admin_headers)
+        measure("GET /admin/stats/series", "GET", "/admin/stats/series", headers=admin_headers,
+                params={"period": "weekly", "days": 90})
+        measure("GET /admin/cache/stats", "GET", "/admin/cache/stats", headers=admin_headers)
+        measure("GET /admin/orders", "GET", "/admin/orders", headers=admin_headers)
+        measure("GET /admin/orders/export", "GET", "/admin/orders/export", headers=admin_headers)
+        measure("GET /admin/users", "GET", "/admin/users", headers=admin_headers)
+        measure("GET /admin/users/export", "GET", "/admin/users/export", headers=admin_headers,
+                params={"format": "csv"})
+        measure("GET /admin/order/items/{order_id}", "GET", f"/admin/order/items/{order_id}", headers=admin_headers)
+        measure("POST /admin/order/{order_id}", "POST", f"/admin/order/{order_id}", headers=admin_headers,
+                json={"id": order_id, "status": "completed"})
+        measure("GET /admin/jobs", "GET", "/admin/jobs", headers=admin_headers)
+    return counts
+
+
+# Cart and order history sizes the scenario runs at.
+SMALL, LARGE = 2, 25
+
+
+def verdict(key: str, small: dict, large: dict) -> str:
+    """Returns "ok", or how the endpoint's statement counts at the two sizes break its budget."""
+    if key not in BUDGETS:
+        return "NO BUDGET"
+    if key not in small:
+        return "NOT EXERCISED"
+    if max(small[key], large[key]) > BUDGETS[key]:
+        return "OVER BUDGET"
+    if large[key] != small[key]:
+        return "GROWS WITH DATA"
+    return "ok"
+
+
+def main():
+    main, counter = setup()
+    small, large = run_scenario(main, counter, SMALL), run_scenario(main, counter, LARGE)
+    failures = []
+    for key, budget in BUDGETS.items():
+        status = verdict(key, small, large)
+        if status == "NOT EXERCISED":
+            failures.append(f"{key}: not exercised")
+            continue
+        if status != "ok":
+            failures.append(key)
+        print(f"{key:40} budget={budget:<3} small={small[key]:<3} large={large[key]:<3} {status}")
+    missing = set(small) - set(BUDGETS)
+    if missing:
+        failures.extend(f"{key}: no budget" for key in sorted(missing))
+    if failures:
+        print("\nFAILED:", ", ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
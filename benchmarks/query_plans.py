@@ -0,0 +1,186 @@
+"""
+Runs every endpoint in main.py (the query_budget.py scenario) against a large
+seeded SQLite database, then checks the EXPLAIN QUERY PLAN of every distinct
+SQL statement they executed. The script exits non-zero if a statement reads a
+whole table instead of searching an index, or if a LIMIT query sorts every
+row it matches to find the first few, unless that is listed in ALLOWED with
+the reason it is acceptable. tests/test_query_plans.py runs the same check on
+a smaller database (SQLite plans don't depend on table sizes without ANALYZE).
+
+    python benchmarks/query_plans.py --users 20000 --items 200000 --orders 200000
+"""
+import argparse
+import re
+import sys
+from urllib.parse import urlencode
+
+from query_budget import StatementCounter, run_scenario  # sets the environment the scenario needs
+
+from common import create_user, import_app, seed_items, seed_orders
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+SORT = "sort before LIMIT"
+# Cart and order history size for the query_budget scenario; not one of its own
+# sizes, so its users don't clash with a budget run in the same database.
+SCENARIO_LINES = 3
+
+# (endpoint, table scanned or SORT) -> why that is fine there.
+ALLOWED = {
+    ("GET /admin/jobs", "jobs"): "counts jobs by kind and status; finished jobs are purged after JOB_RETENTION_DAYS",
+    ("GET /admin/jobs", SORT): "the newest failed jobs: only failed ones are sorted",
+    ("GET /search/items", SORT): "ranks the full-text matches, which the index has already narrowed down",
+}
+
+# "SCAN items" reads the table in rowid order, "SCAN items USING INDEX ..."
+# walks an index in order, and "SEARCH ..." looks rows up through an index.
+TABLE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+class StatementRecorder(StatementCounter):
+    """Also keeps the first parameters each distinct statement ran with, and the endpoint that ran it."""
+
+    def __init__(self, engines):
+        self.endpoint = None
+        self.statements = {}  # statement -> (endpoint, parameters)
+        super().__init__(engines)
+
+    def start(self, key):
+        super().start(key)
+        self.endpoint = key
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        super()._on_execute()
+        seen = self.statements.get(statement)
+        if seen is None or seen[0] is None:
+            self.statements[statement] = (self.endpoint, parameters[0] if executemany else parameters)
+
+
+# Listing filters and sorts the scenario leaves out; each one shapes the query
+# differently. Every variant is also fetched a second time from its next_cursor.
+ITEM_LISTINGS = [
+    *({"sort": sort} for sort in ("newest", "oldest", "price_asc", "price_desc")),
+    *({"category": "Women", "sort": sort} for sort in ("newest", "price_asc")),
+    {"min_price": 100, "max_price": 200, "sort": "price_asc"},
+    {"in_stock": "true"},
+    {"category": "Men", "in_stock": "true", "min_price": 50, "sort": "price_desc"},
+]
+ORDER_LISTINGS = [
+    {"status": "shipped"},
+    {"customer_id": 5},
+    {"placed_from": "2025-01-01T00:00:00", "placed_to": "2025-02-01T00:00:00"},
+    {"status": "pending", "customer_id": 5},
+]
+
+
+def run_listing_variants(main, recorder):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    admin = create_user(db, "plans-admin@example.com", role="admin")
+    db.close()
+    with TestClient(main.app) as client:
+        token = client.post("/token", data={"username": admin.email, "password": "password"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for path, key, variants in (("/items", "items", ITEM_LISTINGS), ("/admin/orders", "orders", ORDER_LISTINGS)):
+            for params in variants:
+                recorder.start(f"GET {path}?{urlencode(params)}")
+                page = client.get(path, params=params, headers=headers).json()
+                if page.get("next_cursor"):
+                    client.get(path, params={**params, "cursor": page["next_cursor"]}, headers=headers)
+
+
+def seed(engine, users: int, items: int, orders: int):
+    import auth
+
+    password = auth.get_password_hash("password")
+    raw = engine.raw_connection()
+    try:
+        raw.cursor().executemany(
+            "INSERT INTO users (email, full_name, password, role) VALUES (?, ?, ?, 'consumer')",
+            ((f"user{n}@example.com", f"User {n}", password) for n in range(users)),
+        )
+        raw.commit()
+    finally:
+        raw.close()
+    seed_items(engine, items)
+    seed_orders(engine, orders, customer_id=1, item_id=1, customers=users, items=items)
+
+
+def problems(statement: str, plan) -> list[str]:
+    """The tables the plan reads in full, plus SORT if a LIMIT query sorts all its matches first."""
+    if isinstance(plan, str):
+        return []
+    details = [line.rsplit(" | ", 1)[-1] for line in plan]
+    sorts = any(detail == "USE TEMP B-TREE FOR ORDER BY" for detail in details)
+    if " LIMIT " in statement:
+        if sorts:
+            return [SORT]
+        if not any(detail.startswith("USE TEMP B-TREE") for detail in details):
+            # Rows come out in ORDER BY order (by id, e.g. newest first) without
+            # a sort step, so the scan stops once LIMIT rows have matched.
+            return []
+    return [match.group(1) for match in map(TABLE_SCAN.match, details) if match]
+
+
+def check_plans(main_module) -> list[tuple[str, str, list | str, list[str]]]:
+    """
+    Runs the scenario and the listing variants, then returns (endpoint,
+    statement, plan, problems not in ALLOWED) for each distinct statement.
+    """
+    import database
+    import profiling
+
+    engines = [database.engine] + ([database.async_engine.sync_engine] if database.async_engine else [])
+    recorder = StatementRecorder(engines)
+    try:
+        run_scenario(main_module, recorder, SCENARIO_LINES)
+        run_listing_variants(main_module, recorder)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", recorder._on_execute)
+
+    results = []
+    with database.engine.connect() as conn:
+        for statement, (endpoint, parameters) in recorder.statements.items():
+            plan = profiling.explain(conn, statement, parameters)
+            endpoint = endpoint or "(login and setup)"
+            found = [problem for problem in problems(statement, plan) if (endpoint, problem) not in ALLOWED]
+            results.append((endpoint, statement, plan, found))
+    return results
+
+
+def describe(found: list[str]) -> str:
+    return ", ".join(f"full scan of {p}" if p != SORT else p for p in found).upper() or "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--items", type=int, default=200_000)
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--verbose", action="store_true", help="print every plan, not only the failing ones")
+    options = parser.parse_args()
+
+    main_module = import_app()
+    import database
+
+    seed(database.engine, options.users, options.items, options.orders)
+    results = check_plans(main_module)
+    failures = 0
+    for endpoint, statement, plan, found in results:
+        if found or options.verbose:
+            print(f"{describe(found)}  [{endpoint}]")
+            print("   ", " ".join(statement.split())[:300])
+            for line in plan if isinstance(plan, list) else [plan]:
+                print("      ", line)
+        failures += bool(found)
+
+    print(f"\n{len(results)} distinct statements checked, {failures} with a full scan or sort")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
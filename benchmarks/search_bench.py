@@ -0,0 +1,52 @@
+"""
+Compares /search/items latency of the FTS5 index against the LIKE fallback.
+
+    python benchmarks/search_bench.py --sizes 10000,100000,1000000
+"""
+import argparse
+import json
+import random
+
+from common import BRANDS, WORDS, seed_items, summarize, temp_sqlite_url, time_calls
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import search
+from database import Base
+
+
+def run(size: int, queries: int) -> dict:
+    engine = create_engine(temp_sqlite_url())
+    Base.metadata.create_all(bind=engine)
+    seed_items(engine, size)
+    search.install_fts(engine)
+    db = sessionmaker(bind=engine)()
+
+    rng = random.Random(7)
+    # What a search box sends: brand prefixes while typing, brand + product words.
+    terms = []
+    for i in range(queries):
+        brand = rng.choice(BRANDS)
+        if i % 2:
+            terms.append(brand[: rng.randint(3, len(brand))])
+        else:
+            terms.append(f"{brand} {rng.choice(WORDS)}")
+    args = [(db, term, 20, 0) for term in terms]
+
+    result = {"items": size}
+    for name, fn in (("like", search.like_search), ("fts", search.fts_search)):
+        fn(*args[0])  # warm the page cache
+        result[name] = summarize(time_calls(fn, args))
+    db.close()
+    engine.dispose()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=200)
+    options = parser.parse_args()
+    results = [run(int(size), options.queries) for size in options.sizes.split(",")]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,97 @@
+"""
+Serialization cost per 1,000 objects for the response paths used by main.py,
+plus the size of each body after gzip and brotli.
+
+    python benchmarks/serialization_bench.py
+"""
+import argparse
+import gzip
+import json
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import common  # noqa: F401  (puts the repository on sys.path)
+
+from fastapi.encoders import jsonable_encoder
+
+import models
+import schemas
+import serialization
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_items(count: int):
+    return [
+        models.Item(id=i, name=f"Linen shirt {i}", description="Relaxed fit shirt in washed linen, " * 3,
+                    price=Decimal(10 + i % 90), quantity=i % 50, category="Men",
+                    image_name=f"{i:064x}.jpg")
+        for i in range(1, count + 1)
+    ]
+
+
+def make_orders(count: int, lines: int = 3):
+    started = datetime(2025, 1, 1)
+    orders = []
+    for i in range(1, count + 1):
+        order = models.Order(id=i, customer_name=f"Customer {i}", customer_phone="555-0100",
+                             customer_address=f"{i} Main Street", status="pending",
+                             order_date=started + timedelta(minutes=i), total_amount=Decimal("59.97"),
+                             customer_id=1 + i % 100)
+        order.items = [
+            models.OrderItem(id=i * lines + n, order_id=i, item_id=n + 1, quantity=1, price=Decimal("19.99"))
+            for n in range(lines)
+        ]
+        orders.append(order)
+    return orders
+
+
+def per_call_ms(fn, repeat: int, number: int) -> float:
+    return round(min(timeit.repeat(fn, repeat=repeat, number=number)) / number * 1000, 3)
+
+
+def main(count: int, repeat: int, number: int) -> dict:
+    cases = {
+        "items": (list[schemas.Item], make_items(count)),
+        "orders_with_lines": (list[schemas.OrderDetail], make_orders(count)),
+    }
+    results = {"objects": count}
+    for name, (schema, objects) in cases.items():
+        adapter = serialization.type_adapter(schema)
+        body = serialization.dump_json(schema, objects)
+        assert body == adapter.dump_json(adapter.validate_python(objects))
+        results[name] = {
+            # FastAPI <= 0.11x: validate, jsonable_encoder, json.dumps.
+            "jsonable_encoder_ms": per_call_ms(
+                lambda: json.dumps(jsonable_encoder(adapter.validate_python(objects))).encode(), repeat, number),
+            # FastAPI's current response_model path: validate from attributes, dump_json.
+            "response_model_ms": per_call_ms(
+                lambda: adapter.dump_json(adapter.validate_python(objects)), repeat, number),
+            "serialization_dump_json_ms": per_call_ms(
+                lambda: serialization.dump_json(schema, objects), repeat, number),
+            "bytes": len(body),
+            "gzip_6_bytes": len(gzip.compress(body, 6)),
+            "brotli_4_bytes": len(brotli.compress(body, quality=4)) if brotli else None,
+        }
+
+    stats = [{"day": datetime(2025, 1, 1).date() + timedelta(days=i), "orders": i,
+              "revenue": Decimal("1234.50") + i} for i in range(count)]
+    results["plain_dicts"] = {
+        "jsonable_encoder_ms": per_call_ms(lambda: json.dumps(jsonable_encoder(stats)).encode(), repeat, number),
+        "serialization_dumps_ms": per_call_ms(lambda: serialization.dumps(stats), repeat, number),
+        "encoder": serialization.JSON_ENCODER,
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--number", type=int, default=20)
+    options = parser.parse_args()
+    print(json.dumps(main(options.count, options.repeat, options.number), indent=2))
@@ -0,0 +1,60 @@
+"""
+Throughput and latency of the same traffic mix against 1..N server worker
+processes started through serve.py, to show how far adding workers helps on
+this machine.
+
+    python benchmarks/worker_scaling.py --workers 1,2,4,8 --duration 30
+
+Each worker count is a separate load_test.py run (uvicorn target) with its own
+freshly seeded database. Scaling beyond the number of CPUs, which is printed
+with the results, is not expected; neither is it past the point where the
+load generator itself, a single process, saturates its CPU.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+LOAD_TEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_test.py")
+
+
+def run(workers: int, options) -> dict:
+    args = [sys.executable, LOAD_TEST, "--target", "uvicorn", "--workers", str(workers)]
+    for name in ("users", "items", "orders", "carts", "concurrency", "duration", "warmup"):
+        args += [f"--{name}", str(getattr(options, name))]
+    output = subprocess.run(args, check=True, capture_output=True, text=True, env=os.environ).stdout
+    return json.loads(output)["targets"]["uvicorn"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=20_000)
+    parser.add_argument("--carts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64, help="simulated clients")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=3)
+    options = parser.parse_args()
+
+    results = {}
+    for workers in (int(n) for n in options.workers.split(",")):
+        total = run(workers, options)["total"]
+        results[f"{workers}_workers"] = {
+            "rps": total["rps"], "errors": total["errors"],
+            "p50_ms": total["p50_ms"], "p95_ms": total["p95_ms"], "p99_ms": total["p99_ms"],
+        }
+    baseline = next(iter(results.values()))["rps"]
+    for result in results.values():
+        result["speedup"] = round(result["rps"] / baseline, 2) if baseline else None
+    print(json.dumps({
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "concurrency": options.concurrency,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
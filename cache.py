@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CATALOG_CACHE_ENABLED = os.getenv("CATALOG_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "10000"))
+CATALOG_CACHE_MAX_BYTES = int(os.getenv("CATALOG_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Entries can carry tags so a write can drop every entry that depends on it
+    (e.g. every list page containing a given item). When `max_bytes` is set,
+    values must be bytes and the cache evicts least-recently-used entries until
+    the sum of their lengths fits.
+
+    `generation` increases on every invalidation. Readers capture it before
+    querying the database and pass it to `set`, so a value computed before a
+    concurrent write committed is never stored after that write's invalidation.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_bytes: int | None = None, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._entries = OrderedDict()  # key -> (expires_at, value, size, tags)
+        self._tags = {}  # tag -> set of keys
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Returns the cached value, or None on a miss."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags=(), generation: int | None = None) -> None:
+        if not self.enabled:
+            return
+        size = len(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            tags = frozenset(tags)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size, tags)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self.generation += 1
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tags(self, *tags) -> None:
+        """Drops every entry carrying any of `tags`."""
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key) -> None:
+        _, _, size, tags = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# Pre-serialized JSON bodies for GET /items/{id} and the catalog listing pages.
+catalog_cache = TTLCache(
+    maxsize=CATALOG_CACHE_MAX_ENTRIES,
+    ttl=CATALOG_CACHE_TTL,
+    max_bytes=CATALOG_CACHE_MAX_BYTES,
+    enabled=CATALOG_CACHE_ENABLED,
+)
+
+
+def item_tag(item_id: int) -> str:
+    return f"item:{item_id}"
+
+
+def listing_tag(category: str | None) -> str:
+    return f"list:{category if category is not None else '*'}"
+
+
+def invalidate_items(item_ids) -> None:
+    """Call after an item changes: drops its detail entry and every page that contains it."""
+    catalog_cache.invalidate_tags(*(item_tag(item_id) for item_id in item_ids))
+
+
+def invalidate_listings(category: str | None) -> None:
+    """Call after an item is added to `category`: drops the pages it could now appear on."""
+    catalog_cache.invalidate_tags(listing_tag(None), listing_tag(category))
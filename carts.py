@@ -0,0 +1,93 @@
+from fastapi import HTTPException, status
+from sqlalchemy import delete, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+from database import dialect_insert
+
+CART_KEY = [models.Cart.user_id, models.Cart.item_id]  # the _user_item_uc constraint
+
+
+def _upsert(db: AsyncSession, source=None, *, increment: bool):
+    """
+    INSERT INTO cart ... ON CONFLICT (user_id, item_id) DO UPDATE, adding to the
+    existing quantity or replacing it.
+    """
+    statement = dialect_insert(db.get_bind())(models.Cart)
+    if source is not None:
+        statement = statement.from_select(["user_id", "item_id", "quantity"], source)
+    quantity = models.Cart.quantity + statement.excluded.quantity if increment else statement.excluded.quantity
+    return statement.on_conflict_do_update(index_elements=CART_KEY, set_={"quantity": quantity})
+
+
+async def add_item(db: AsyncSession, user_id: int, item_id: int, quantity: int):
+    """
+    Adds `quantity` units of an item to the user's cart, or to the line already
+    there, in a single statement. Returns the cart line, or None if the item
+    doesn't exist.
+    """
+    # Selecting the values from `items` makes a missing item insert nothing.
+    source = select(literal(user_id), models.Item.id, literal(quantity)).where(models.Item.id == item_id)
+    statement = _upsert(db, source, increment=True).returning(
+        models.Cart.id, models.Cart.user_id, models.Cart.item_id, models.Cart.quantity,
+    )
+    return (await db.execute(statement)).mappings().first()
+
+
+async def apply_operations(db: AsyncSession, user_id: int, operations: list[schemas.CartOperation]):
+    """
+    Applies cart operations in the caller's transaction. Operations on the same
+    item are folded in order first, so the whole batch takes one statement per
+    kind of change however many lines it touches. 404 if any item doesn't exist.
+    """
+    changes = {}  # item_id -> ("add", delta) or ("set", quantity)
+    for operation in operations:
+        mode, value = changes.get(operation.item_id, ("add", 0))
+        if operation.mode == "set":
+            changes[operation.item_id] = ("set", operation.quantity)
+        else:
+            changes[operation.item_id] = (mode, value + operation.quantity)
+
+    found = set(await db.scalars(select(models.Item.id).where(models.Item.id.in_(changes))))
+    missing = sorted(set(changes) - found)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"message": "Item not found", "item_ids": missing},
+        )
+
+    added = [(item_id, value) for item_id, (mode, value) in changes.items() if mode == "add"]
+    replaced = [(item_id, value) for item_id, (mode, value) in changes.items() if mode == "set" and value > 0]
+    removed = [item_id for item_id, (mode, value) in changes.items() if mode == "set" and value == 0]
+    for rows, increment in ((added, True), (replaced, False)):
+        if rows:
+            await db.execute(
+                _upsert(db, increment=increment),
+                [{"user_id": user_id, "item_id": item_id, "quantity": value} for item_id, value in rows],
+            )
+    if removed:
+        await db.execute(
+            delete(models.Cart)
+            .where(models.Cart.user_id == user_id, models.Cart.item_id.in_(removed))
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def read_cart(db: AsyncSession, user_id: int):
+    """The user's cart lines with each item's current name, price and stock, in one query."""
+    return (await db.execute(
+        select(
+            models.Cart.id,
+            models.Cart.user_id,
+            models.Cart.item_id,
+            models.Cart.quantity,
+            models.Item.name,
+            models.Item.price,
+            models.Item.quantity.label("available"),
+            models.Item.image_name,
+        )
+        .join(models.Cart.item)
+        .where(models.Cart.user_id == user_id)
+        .order_by(models.Cart.id)
+    )).mappings().all()
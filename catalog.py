@@ -0,0 +1,105 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+from typing import Literal
+
+from sqlalchemy.orm import Session
+
+import models
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+SortOption = Literal["newest", "oldest", "price_asc", "price_desc"]
+
+# sort name -> (order column, descending)
+SORT_OPTIONS = {
+    "newest": (None, True),
+    "oldest": (None, False),
+    "price_asc": (models.Item.price, False),
+    "price_desc": (models.Item.price, True),
+}
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded for the requested sort."""
+
+
+def encode_cursor(sort: SortOption, item: models.Item) -> str:
+    """Builds an opaque cursor pointing just after `item` in the given sort order."""
+    column, _ = SORT_OPTIONS[sort]
+    key = [item.id] if column is None else [str(item.price), item.id]
+    raw = json.dumps([sort, *key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(sort: SortOption, cursor: str):
+    """Returns the sort key stored in `cursor`, validating it belongs to `sort`."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, *key = json.loads(base64.urlsafe_b64decode(padded))
+        column, _ = SORT_OPTIONS[sort]
+        if cursor_sort != sort:
+            raise InvalidCursor("Cursor was issued for a different sort order")
+        if column is None:
+            (last_id,) = key
+            return (int(last_id),)
+        last_price, last_id = key
+        return (Decimal(last_price), int(last_id))
+    except InvalidCursor:
+        raise
+    except (ValueError, TypeError, InvalidOperation):
+        raise InvalidCursor("Malformed cursor")
+
+
+def list_items(
+    db: Session,
+    *,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    sort: SortOption = "newest",
+    category: str | None = None,
+    min_price: int | None = None,
+    max_price: int | None = None,
+    in_stock: bool = False,
+):
+    """
+    Returns one page of items and the cursor for the next page (None on the last page).
+
+    Pages are keyset-paginated on (id) or (price, id), so fetching page N costs the
+    same as fetching page 1 and is served by the items(category, id) /
+    items(price, id) indexes.
+    """
+    column, descending = SORT_OPTIONS[sort]
+    Item = models.Item
+
+    query = db.query(Item)
+    if category is not None:
+        query = query.filter(Item.category == category)
+    if min_price is not None:
+        query = query.filter(Item.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Item.price <= max_price)
+    if in_stock:
+        query = query.filter(Item.quantity > 0)
+
+    if cursor is not None:
+        key = decode_cursor(sort, cursor)
+        if column is None:
+            (last_id,) = key
+            query = query.filter(Item.id < last_id if descending else Item.id > last_id)
+        else:
+            last_price, last_id = key
+            if descending:
+                query = query.filter((column < last_price) | ((column == last_price) & (Item.id < last_id)))
+            else:
+                query = query.filter((column > last_price) | ((column == last_price) & (Item.id > last_id)))
+
+    order = [Item.id] if column is None else [column, Item.id]
+    query = query.order_by(*(c.desc() if descending else c.asc() for c in order))
+
+    # Fetch one extra row to know whether another page exists without a COUNT(*).
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = encode_cursor(sort, items[-1]) if len(rows) > limit else None
+    return items, next_cursor
@@ -0,0 +1,202 @@
+import csv
+import io
+import json
+import os
+from typing import Literal
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+import cache
+import imaging
+import invalidation
+import jobs
+import models
+import schemas
+import stats
+import tasks
+from database import SessionLocal, dialect_insert
+
+load_dotenv()
+
+# Rows written per transaction. Each batch is one executemany per statement.
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+# Failed rows beyond this are counted but not listed in the report.
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+ImportFormat = Literal["csv", "ndjson"]
+FILE_EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+CONTENT_TYPES = {"text/csv": "csv", "application/x-ndjson": "ndjson", "application/jsonl": "ndjson"}
+UPDATED_COLUMNS = ["name", "description", "price", "quantity", "category"]
+
+
+def guess_format(filename: str | None, content_type: str | None = None) -> ImportFormat | None:
+    """The import format implied by a file name or, failing that, a content type."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in FILE_EXTENSIONS:
+        return FILE_EXTENSIONS[extension]
+    return CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+
+
+def read_rows(binary_file, import_format: ImportFormat):
+    """
+    Yields (line number, record) for each row of a CSV (with a header row) or
+    NDJSON file, reading one line at a time. A record is a dict of the given
+    fields, or an error message for a line that couldn't be parsed.
+    """
+    text_file = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    try:
+        if import_format == "csv":
+            reader = csv.DictReader(text_file)
+            for record in reader:
+                # Empty cells mean "not given", e.g. no id for a new item.
+                yield reader.line_num, {
+                    key: value for key, value in record.items() if key is not None and value not in ("", None)
+                }
+        else:
+            for number, line in enumerate(text_file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield number, f"Invalid JSON: {e}"
+                    continue
+                yield number, record if isinstance(record, dict) else "Expected a JSON object"
+    finally:
+        # Leave the caller's file open.
+        text_file.detach()
+
+
+def describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in entry['loc']) or 'row'}: {entry['msg']}" for entry in error.errors()
+    )
+
+
+def image_error(image_name: str) -> str | None:
+    """Why `image_name` can't be used for an item, or None if it names a file in images/."""
+    if os.path.basename(image_name) != image_name:
+        return "image_name: Must be a file name, without a directory"
+    if not os.path.isfile(os.path.join(imaging.IMAGES_DIR, image_name)):
+        return f"image_name: No such file in {imaging.IMAGES_DIR}/"
+    return None
+
+
+def write_batch(session: Session, rows: list[tuple[int, dict]]) -> tuple[int, int, list[tuple[int, str]]]:
+    """
+    Inserts rows without an id and upserts rows with one, in the caller's
+    transaction, and queues the image variants of the images they name.
+    Returns (created, updated, [(line, error), ...]).
+    """
+    ids = {values["id"] for _, values in rows if values["id"] is not None}
+    existing = set(session.scalars(select(models.Item.id).where(models.Item.id.in_(ids)))) if ids else set()
+    image_errors = {
+        name: image_error(name) for name in {values["image_name"] for _, values in rows} if name is not None
+    }
+    new, keyed, errors = [], [], []
+    for line, values in rows:
+        if values["image_name"] is None and values["id"] not in existing:
+            errors.append((line, "image_name: Required for new items"))
+        elif image_errors.get(values["image_name"]):
+            errors.append((line, image_errors[values["image_name"]]))
+        elif values["id"] is None:
+            new.append({key: value for key, value in values.items() if key != "id"})
+        else:
+            keyed.append(values)
+
+    if new:
+        session.execute(insert(models.Item), new)
+    if keyed:
+        statement = dialect_insert(session.get_bind())(models.Item)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[models.Item.id],
+            set_={
+                **{column: statement.excluded[column] for column in UPDATED_COLUMNS},
+                # A row without an image keeps the item's current one.
+                "image_name": func.coalesce(statement.excluded.image_name, models.Item.image_name),
+            },
+        ), keyed)
+
+    created_with_id = len({values["id"] for values in keyed} - existing)
+    if created_with_id and session.get_bind().dialect.name == "postgresql":
+        # Explicit ids don't advance the serial sequence; catch it up so later
+        # inserts without an id don't collide.
+        session.execute(text("SELECT setval(pg_get_serial_sequence('items', 'id'), (SELECT max(id) FROM items))"))
+    created = len(new) + created_with_id
+    if created:
+        stats.record_item_created(session, created)
+    if imaging.IMAGE_VARIANTS_ENABLED:
+        for image_name in {values["image_name"] for values in new + keyed if values["image_name"] is not None}:
+            jobs.enqueue(
+                session, tasks.IMAGE_VARIANTS, {"image_name": image_name}, key=f"{tasks.IMAGE_VARIANTS}:{image_name}"
+            )
+    # For the other API processes: updated items and every category touched.
+    if keyed:
+        invalidation.publish(session, "items", [values["id"] for values in keyed])
+    invalidation.publish(session, "listings", list({values["category"] for _, values in rows}))
+    return created, len(keyed) - created_with_id, errors
+
+
+def _commit_batch(session_factory, rows: list[tuple[int, dict]], report: dict, fail):
+    try:
+        with session_factory() as session, session.begin():
+            created, updated, errors = write_batch(session, rows)
+    except SQLAlchemyError as e:
+        if len(rows) == 1:
+            fail(rows[0][0], f"Database error: {getattr(e, 'orig', None) or e}")
+            return
+        # Retry the rows one by one so only the offending ones are rejected.
+        for row in rows:
+            _commit_batch(session_factory, [row], report, fail)
+        return
+    for line, message in errors:
+        fail(line, message)
+    report["created"] += created
+    report["updated"] += updated
+    # This process's catalog cache; the others apply the records write_batch published.
+    cache.invalidate_items(values["id"] for _, values in rows if values["id"] is not None)
+    for category in {values["category"] for _, values in rows}:
+        cache.invalidate_listings(category)
+
+
+def import_file(binary_file, import_format: ImportFormat, batch_size: int = IMPORT_BATCH_SIZE,
+                session_factory=SessionLocal) -> dict:
+    """
+    Creates or updates items from a CSV or NDJSON file, validating each row
+    with schemas.ItemImport. Rows are written in batches of `batch_size`, each
+    in its own transaction; invalid rows are reported and skipped without
+    aborting the rest. Returns a dict shaped like schemas.ImportReport.
+    """
+    report = {"rows": 0, "created": 0, "updated": 0, "failed": 0, "errors": []}
+
+    def fail(line: int, message: str):
+        report["failed"] += 1
+        if len(report["errors"]) < IMPORT_MAX_ERRORS:
+            report["errors"].append({"row": line, "error": message})
+
+    batch = []
+    line = 0
+    try:
+        for line, record in read_rows(binary_file, import_format):
+            report["rows"] += 1
+            if isinstance(record, str):
+                fail(line, record)
+                continue
+            try:
+                batch.append((line, schemas.ItemImport.model_validate(record).model_dump()))
+            except ValidationError as e:
+                fail(line, describe(e))
+                continue
+            if len(batch) >= batch_size:
+                _commit_batch(session_factory, batch, report, fail)
+                batch = []
+    except (csv.Error, UnicodeDecodeError) as e:
+        fail(line + 1, f"Unreadable input, import stopped: {e}")
+    if batch:
+        _commit_batch(session_factory, batch, report, fail)
+    report["errors"].sort(key=lambda entry: entry["row"])
+    return report
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import random
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+import invalidation
+import jobs
+import models
+import schemas
+import stats
+import tasks
+
+logger = logging.getLogger(__name__)
+
+# How many times a checkout is retried after losing a write race, and the base
+# delay of the jittered exponential backoff between attempts.
+CHECKOUT_MAX_RETRIES = int(os.getenv("CHECKOUT_MAX_RETRIES", "5"))
+CHECKOUT_RETRY_BASE_DELAY = float(os.getenv("CHECKOUT_RETRY_BASE_DELAY", "0.01"))
+
+# PostgreSQL serialization_failure and deadlock_detected.
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+
+class InsufficientStock(Exception):
+    """Raised when at least one cart line asks for more than is in stock."""
+
+    def __init__(self, shortages):
+        super().__init__("Insufficient stock")
+        self.shortages = shortages  # [{"item_id", "requested", "available"}]
+
+
+def is_retryable(error: DBAPIError) -> bool:
+    """True for lock/serialization conflicts that succeed when the transaction is replayed."""
+    orig = error.orig
+    message = str(orig).lower()
+    if "database is locked" in message or "database is busy" in message:
+        return True
+    sqlstate = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    return sqlstate in RETRYABLE_SQLSTATES
+
+
+async def place_order(db: AsyncSession, order: schemas.OrderCreate, customer_id: int):
+    """
+    Turns the customer's cart into an order in one transaction, which the caller commits.
+    Stock is reserved with a single conditional UPDATE, so two checkouts can never
+    both take the last unit. Returns the order and the ids of the items whose stock changed.
+    """
+    # 1. Get all cart items for the customer.
+    cart_items = (await db.scalars(
+        select(models.Cart)
+        .options(selectinload(models.Cart.item))
+        .where(models.Cart.user_id == customer_id)
+    )).all()
+
+    if not cart_items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
+
+    # 2. Calculate the total amount based on the prices and quantities in the cart.
+    total_amount = sum(item.item.price * item.quantity for item in cart_items)
+
+    if total_amount <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Total amount must be positive")
+
+    # 3. Reserve stock for every line at once:
+    #    UPDATE items SET quantity = quantity - <n> WHERE id IN (...) AND quantity >= <n>
+    # Lines without enough stock match no row, so a short rowcount means the
+    # order can't be filled and the whole transaction is rolled back.
+    requested = {item.item_id: item.quantity for item in cart_items}
+    items_table = models.Item.__table__
+    requested_quantity = case(requested, value=items_table.c.id)
+    result = await db.execute(
+        update(items_table)
+        .where(items_table.c.id.in_(requested), items_table.c.quantity >= requested_quantity)
+        .values(quantity=items_table.c.quantity - requested_quantity)
+    )
+    if result.rowcount != len(requested):
+        await db.rollback()
+        available = dict((await db.execute(
+            select(items_table.c.id, items_table.c.quantity).where(items_table.c.id.in_(requested))
+        )).all())
+        raise InsufficientStock([
+            {"item_id": item_id, "requested": quantity, "available": available.get(item_id, 0)}
+            for item_id, quantity in requested.items()
+            if available.get(item_id, 0) < quantity
+        ])
+
+    # 4. Create the main Order object with customer details and insert it to get its id.
+    new_order = models.Order(
+        customer_name=order.customer_name,
+        customer_phone=order.customer_phone,
+        customer_address=order.customer_address,
+        status="pending",  # It's best practice to set a default status on the backend.
+        total_amount=total_amount,
+        customer_id=customer_id
+    )
+    db.add(new_order)
+    await db.flush()
+    await db.run_sync(stats.record_order_placed, new_order.order_date)
+    # The confirmation email goes out after the order commits, not during the request.
+    await db.run_sync(
+        jobs.enqueue, tasks.ORDER_PLACED, {"order_id": new_order.id}, key=f"{tasks.ORDER_PLACED}:{new_order.id}"
+    )
+    # Stock levels changed: the other API processes drop their cached copies of these items.
+    await db.run_sync(invalidation.publish, "items", list(requested))
+
+    # 5. Insert every line item with one executemany. (Adding OrderItem objects
+    # through the relationship costs one INSERT per line on SQLite, which can't
+    # batch inserts that need their primary keys returned in order.)
+    await db.execute(
+        insert(models.OrderItem.__table__),
+        [
+            {
+                "order_id": new_order.id,
+                "item_id": item.item_id,
+                "quantity": item.quantity,
+                "price": item.item.price,  # Store the price at the time of the order.
+            }
+            for item in cart_items
+        ],
+    )
+
+    # 6. Empty the cart.
+    await db.execute(
+        delete(models.Cart)
+        .where(models.Cart.user_id == customer_id)
+        .execution_options(synchronize_session=False)
+    )
+    return new_order, list(requested)
+
+
+async def checkout(db: AsyncSession, order: schemas.OrderCreate, customer_id: int, before_commit=None):
+    """
+    Runs and commits place_order, replaying it with jittered exponential backoff
+    when it loses a lock or serialization race, up to CHECKOUT_MAX_RETRIES times.
+    `before_commit(new_order)`, if given, is awaited inside the same transaction.
+    """
+    for attempt in range(CHECKOUT_MAX_RETRIES + 1):
+        try:
+            new_order, item_ids = await place_order(db, order, customer_id)
+            if before_commit is not None:
+                await before_commit(new_order)
+            await db.commit()
+            return new_order, item_ids
+        except DBAPIError as e:
+            await db.rollback()
+            if attempt == CHECKOUT_MAX_RETRIES or not is_retryable(e):
+                raise
+            logger.info("Checkout conflict for customer %s, retry %d: %s", customer_id, attempt + 1, e.orig)
+            await asyncio.sleep(CHECKOUT_RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
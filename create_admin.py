@@ -1,8 +1,11 @@
 import getpass
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
+import invalidation
 import models
+import stats
 from auth import get_password_hash
+from init_db import init_db
 
 def create_admin_user():
     """
@@ -26,6 +29,8 @@ def create_admin_user():
             promote = input(f"Do you want to promote this user to an admin? (y/n): ").lower()
             if promote == 'y':
                 existing_user.role = 'admin'
+                # Running servers drop their cached principal within INVALIDATION_POLL_INTERVAL seconds.
+                invalidation.publish(db, "principals", [existing_user.id])
                 db.commit()
                 print(f"Success! User '{email}' has been promoted to an admin.")
             return
@@ -52,6 +57,7 @@ def create_admin_user():
         )
         
         db.add(admin_user)
+        stats.record_user_created(db)
         db.commit()
         
         print(f"\nSuccess! Admin user '{full_name}' with email '{email}' created.")
@@ -61,5 +67,5 @@ def create_admin_user():
 
 if __name__ == "__main__":
     # Create the database tables if they don't exist
-    models.Base.metadata.create_all(bind=engine)
+    init_db(engine)
     create_admin_user()
@@ -1,11 +1,241 @@
-from sqlalchemy import create_engine
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import FrozenResult, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
 
 # 1. Define the database connection URL
-DATABASE_URL = "sqlite:///./database.db" # Using an in-memory SQLite database for this example
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database.db")
+
+# "async": the API talks to the database through an asyncio driver (aiosqlite / asyncpg).
+# "sync": the API uses the blocking driver, with every call run in the threadpool.
+DB_MODE = os.getenv("DB_MODE", "async").lower()
+if DB_MODE not in ("async", "sync"):
+    raise ValueError(f"DB_MODE must be 'async' or 'sync', not {DB_MODE!r}")
+
+# Connections kept open by the pool, and extra ones allowed under bursts.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds to wait for a free pooled connection before failing the request.
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Server databases only: reconnect connections older than this many seconds,
+# and test each connection with a cheap ping before handing it out.
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer, synchronous=NORMAL is durable across application crashes in
+# WAL mode, and busy_timeout makes a writer wait for the lock instead of
+# failing immediately with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    # Negative values are KiB rather than pages.
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """Swaps the driver in a sync URL for its asyncio counterpart."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver configured for {backend!r} databases")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(url: str) -> dict:
+    """Pool settings for `url`; recycle and pre-ping only matter for server databases."""
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+    if not is_sqlite(url):
+        options["pool_recycle"] = DB_POOL_RECYCLE
+        options["pool_pre_ping"] = DB_POOL_PRE_PING
+    return options
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def configure_engine(sync_engine):
+    """Installs the per-connection setup for `sync_engine` (or an async engine's .sync_engine)."""
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", apply_sqlite_pragmas)
+    return sync_engine
+
 
 # 2. Create the base class for our models
 Base = declarative_base()
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+
+# The sync engine is always available: schema setup and the command-line tools use it.
+engine = configure_engine(create_engine(DATABASE_URL, **engine_options(DATABASE_URL)))
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+async_engine = (
+    create_async_engine(async_database_url(DATABASE_URL), **engine_options(DATABASE_URL))
+    if DB_MODE == "async" else None
+)
+if async_engine is not None:
+    configure_engine(async_engine.sync_engine)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if async_engine else None
+)
+
+
+def dialect_insert(bind):
+    """insert() for the bind's dialect, which supports ON CONFLICT DO UPDATE on SQLite and PostgreSQL."""
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def describe_engine() -> dict:
+    """The effective database settings, as reported at startup."""
+    report = {
+        "url": engine.url.render_as_string(hide_password=True),
+        "mode": DB_MODE,
+        "driver": (async_engine or engine).dialect.driver,
+        "pool": type(engine.pool).__name__,
+        **engine_options(DATABASE_URL),
+    }
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            report["pragmas"] = {
+                name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in SQLITE_PRAGMAS
+            }
+    return report
+
+
+def log_engine_settings():
+    logger.info("Database settings: %s", describe_engine())
+
+
+class ThreadedSession:
+    """
+    Gives a sync Session the awaitable interface of AsyncSession by running
+    each database call in the threadpool, so request handlers are written once
+    and work in either DB_MODE.
+    """
+
+    def __init__(self, session, on_close=None):
+        self.sync_session = session
+        self._on_close = on_close
+
+    def get_bind(self):
+        return self.sync_session.get_bind()
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None, **kwargs):
+        def execute_buffered():
+            # Fetch every row in the worker thread, like AsyncSession does.
+            result = self.sync_session.execute(statement, params, **kwargs)
+            # ORM selects return an IteratorResult; only DML CursorResults lack rows.
+            if not getattr(result, "returns_rows", True):
+                return result
+            try:
+                return result.freeze()
+            except NotImplementedError:
+                # ORM bulk executemany results have no rows and can't be frozen.
+                return result
+        result = await run_in_threadpool(execute_buffered)
+        return result() if isinstance(result, FrozenResult) else result
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return (await self.execute(statement, params, **kwargs)).scalars()
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return (await self.execute(statement, params, **kwargs)).scalar()
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+
+
+# In sync mode a worker thread waiting for a pooled connection can't be used by
+# the sessions that hold connections, so once every threadpool thread is waiting
+# nothing can finish. Capping open sync sessions at the pool's capacity means a
+# connection is always free for the sessions that exist.
+_sync_session_slots = asyncio.Semaphore(DB_POOL_SIZE + DB_MAX_OVERFLOW)
+
+
+@asynccontextmanager
+async def session_scope():
+    """
+    A session with the AsyncSession interface. Closing it early (e.g. before a
+    long streaming response) returns its connection and, in sync mode, its slot.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield session
+    else:
+        await _sync_session_slots.acquire()
+        session = ThreadedSession(SessionLocal(), on_close=_sync_session_slots.release)
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+async def get_db():
+    """Dependency to get a database session with the AsyncSession interface."""
+    async with session_scope() as session:
+        yield session
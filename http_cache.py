@@ -0,0 +1,63 @@
+import os
+import re
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from fastapi.staticfiles import StaticFiles
+
+load_dotenv()
+
+# How long browsers and CDNs may reuse a catalog response before revalidating
+# it with If-None-Match. 0 means revalidate every time (cheap: a 304 needs no
+# database access).
+CATALOG_HTTP_MAX_AGE = int(os.getenv("CATALOG_HTTP_MAX_AGE", "0"))
+IMAGE_LEGACY_MAX_AGE = int(os.getenv("IMAGE_LEGACY_MAX_AGE", "86400"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# <sha256>.<ext> originals and their <sha256>.<variant>.<ext> copies.
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}(\.[a-z]+)?\.[a-z0-9]+$")
+
+def catalog_cache_control() -> str:
+    return f"public, max-age={CATALOG_HTTP_MAX_AGE}, must-revalidate"
+
+
+def catalog_etag(version: str) -> str:
+    """
+    Weak ETag for catalog responses produced at catalog `version`
+    (invalidation.catalog_version), which every worker process shares.
+    """
+    return f'W/"{version}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match lists `etag` (weak comparison) or is *."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    opaque = etag.removeprefix("W/")
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Serves uploaded images with far-future caching. Content-addressed names
+    never change meaning, so browsers and CDNs may keep them for a year without
+    revalidating; older uuid-named uploads get IMAGE_LEGACY_MAX_AGE.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        name = os.path.basename(full_path)
+        if CONTENT_ADDRESSED_NAME.match(name):
+            response.headers["Cache-Control"] = IMMUTABLE
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={IMAGE_LEGACY_MAX_AGE}"
+        return response
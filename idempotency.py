@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import jobs
+import models
+from database import dialect_insert
+
+load_dotenv()
+
+# How long a stored response is replayed to retries (seconds).
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+# A claim whose request hasn't finished after this many seconds is assumed
+# dead (its process crashed) and the next retry runs the request again.
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+# How long a duplicate waits for the in-flight request before answering 409.
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05  # seconds between checks on a claim held by another process
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+keys_table = models.IdempotencyKey.__table__
+
+# (user_id, key) -> Event set when this process finishes the request holding the key.
+_in_flight: dict[tuple[int, str], asyncio.Event] = {}
+
+
+@dataclass(frozen=True, slots=True)
+class StoredResponse:
+    status_code: int
+    body: bytes
+
+
+def fingerprint(endpoint: str, body: str) -> str:
+    """Identifies a request, so a key reused for a different one is refused."""
+    return hashlib.sha256(f"{endpoint}\n{body}".encode()).hexdigest()
+
+
+def replay(stored: StoredResponse) -> Response:
+    return Response(
+        content=stored.body, status_code=stored.status_code, media_type="application/json",
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+def _key_matches(user_id: int, key: str):
+    return and_(keys_table.c.user_id == user_id, keys_table.c.key == key)
+
+
+async def _try_claim(db: AsyncSession, user_id: int, key: str, request_fingerprint: str, exists: bool) -> bool:
+    """Takes the key for this request: a new row, or one that expired or was abandoned."""
+    now = datetime.utcnow()
+    values = {
+        "fingerprint": request_fingerprint,
+        "status": "in_progress",
+        "status_code": None,
+        "body": None,
+        "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL),
+    }
+    if exists:
+        result = await db.execute(
+            update(keys_table)
+            .where(_key_matches(user_id, key), or_(
+                keys_table.c.expires_at <= now,
+                and_(keys_table.c.status == "in_progress", keys_table.c.locked_until <= now),
+            ))
+            .values(**values)
+        )
+    else:
+        insert = dialect_insert(db.get_bind())
+        result = await db.execute(
+            insert(keys_table).on_conflict_do_nothing(index_elements=[keys_table.c.user_id, keys_table.c.key]),
+            {"user_id": user_id, "key": key, **values},
+        )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def begin(db: AsyncSession, user_id: int, key: str, request_fingerprint: str) -> StoredResponse | None:
+    """
+    Returns the stored response for a key already used by a finished request,
+    or claims the key and returns None, in which case the caller must end with
+    complete() (inside its own transaction) or release().
+
+    A duplicate arriving while the first request is still running waits for
+    it, up to IDEMPOTENCY_WAIT_SECONDS, then gets 409. Reusing a key for a
+    different request body gets 422.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        row = (await db.execute(
+            select(keys_table.c.fingerprint, keys_table.c.status, keys_table.c.status_code, keys_table.c.body,
+                   keys_table.c.locked_until, keys_table.c.expires_at)
+            .where(_key_matches(user_id, key))
+        )).first()
+        now = datetime.utcnow()
+        if row is not None and row.expires_at > now:
+            if row.fingerprint != request_fingerprint:
+                raise HTTPException(status_code=422, detail="This Idempotency-Key was already used for a different request")
+            if row.status == "completed":
+                return StoredResponse(row.status_code, row.body)
+        stale = row is not None and (row.expires_at <= now or row.locked_until <= now)
+        if (row is None or stale) and await _try_claim(db, user_id, key, request_fingerprint, exists=row is not None):
+            _in_flight[(user_id, key)] = asyncio.Event()
+            return None
+
+        # Another request holds the key. End this read transaction, so the
+        # next look sees its commit, and wait for it to finish.
+        await db.rollback()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed",
+                headers={"Retry-After": "1"},
+            )
+        event = _in_flight.get((user_id, key))
+        if event is None:
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+        else:
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def complete(db: AsyncSession, user_id: int, key: str, status_code: int, body: bytes):
+    """Stores the response in the caller's transaction, so it commits together with the work it describes."""
+    await db.execute(
+        update(keys_table).where(_key_matches(user_id, key))
+        .values(status="completed", status_code=status_code, body=body, locked_until=None)
+    )
+
+
+def finished(user_id: int, key: str):
+    """Wakes duplicates in this process waiting for the key; call after complete() has committed."""
+    event = _in_flight.pop((user_id, key), None)
+    if event is not None:
+        event.set()
+
+
+async def release(db: AsyncSession, user_id: int, key: str):
+    """Gives up a claimed key after a failed request, so a retry runs it again."""
+    try:
+        await db.rollback()
+        await db.execute(delete(keys_table).where(_key_matches(user_id, key), keys_table.c.status == "in_progress"))
+        await db.commit()
+    finally:
+        finished(user_id, key)
+
+
+@jobs.housekeeping
+def purge_expired(session: Session) -> int:
+    """Deletes stored responses past their TTL."""
+    return session.execute(delete(keys_table).where(keys_table.c.expires_at <= datetime.utcnow())).rowcount
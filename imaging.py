@@ -0,0 +1,159 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it only originals are served.
+    Image = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+IMAGES_DIR = "images"
+IMAGES_URL = "/images"
+
+# name -> longest side in pixels. Variants are stored next to the original as
+# <stem>.<variant>.<ext>, so they are keyed by Item.image_name and deduplicated
+# along with it.
+VARIANT_SIZES = {"thumb": 320, "medium": 800}
+VARIANT_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+FILE_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+IMAGE_VARIANTS_ENABLED = (
+    os.getenv("IMAGE_VARIANTS_ENABLED", "true").lower() in ("1", "true", "yes") and Image is not None
+)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1)))
+WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+
+
+def variant_name(image_name: str, variant: str, fmt: str) -> str:
+    stem = os.path.splitext(image_name)[0]
+    return f"{stem}.{variant}.{FILE_EXTENSIONS[fmt]}"
+
+
+@lru_cache(maxsize=65536)
+def variant_urls(image_name: str) -> dict:
+    """
+    {"thumb": {"webp": url, "jpeg": url}, "medium": {...}} for an item image.
+    Called for every item serialized, hence cached; treat the result as read-only.
+    """
+    if not IMAGE_VARIANTS_ENABLED:
+        return {}
+    return {
+        variant: {fmt: f"{IMAGES_URL}/{variant_name(image_name, variant, fmt)}" for fmt in VARIANT_FORMATS}
+        for variant in VARIANT_SIZES
+    }
+
+
+def generate_variants(image_name: str, directory: str = IMAGES_DIR, force: bool = False) -> int:
+    """
+    Writes every missing variant of `directory/image_name` and returns how many
+    were written. Runs in a worker process; each file is written to a temporary
+    name and renamed into place, so a half-written variant is never served.
+    """
+    with Image.open(os.path.join(directory, image_name)) as original:
+        # For JPEGs, decode straight at the smallest 1/2, 1/4 or 1/8 scale that
+        # is still at least as big as the largest variant; much faster than a
+        # full-size decode.
+        largest = max(VARIANT_SIZES.values())
+        original.draft("RGB", (largest, largest))
+        # Apply the camera orientation before EXIF is dropped by the re-encode.
+        source = ImageOps.exif_transpose(original)
+        source.load()
+    written = 0
+    # Largest first, each variant downscaled from the previous one.
+    for variant, size in sorted(VARIANT_SIZES.items(), key=lambda entry: -entry[1]):
+        resized = None
+        for fmt, pil_format in VARIANT_FORMATS.items():
+            target = os.path.join(directory, variant_name(image_name, variant, fmt))
+            if not force and os.path.exists(target):
+                continue
+            if resized is None:
+                resized = source.copy()
+                resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+                source = resized
+            if pil_format == "JPEG":
+                image = resized.convert("RGB")
+                options = {"quality": JPEG_QUALITY, "optimize": True, "progressive": True}
+            else:
+                image = resized if resized.mode in ("RGB", "RGBA") else resized.convert("RGBA")
+                options = {"quality": WEBP_QUALITY, "method": 4}
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".variant-", suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    image.save(out, pil_format, **options)
+                os.replace(temp_path, target)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            written += 1
+    return written
+
+
+_pool = None
+_pool_lock = threading.Lock()  # job worker threads share the pool
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked: the server process has live threads and
+            # database connections that must not be copied into the workers.
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def backfill(image_names, directory: str = IMAGES_DIR, force: bool = False) -> dict:
+    """Generates variants for existing images in the process pool. Returns counts."""
+    image_names = sorted(set(image_names))
+    futures = {get_pool().submit(generate_variants, name, directory, force): name for name in image_names}
+    report = {"images": len(image_names), "variants_written": 0, "failed": []}
+    for future, name in futures.items():
+        try:
+            report["variants_written"] += future.result()
+        except Exception as e:
+            logger.error("Generating variants of %s failed: %s", name, e)
+            report["failed"].append(name)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sqlalchemy import select
+
+    import models
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Generate resized variants for existing item images.")
+    parser.add_argument("--force", action="store_true", help="regenerate variants that already exist")
+    options = parser.parse_args()
+    if Image is None:
+        raise SystemExit("Pillow is not installed: pip install Pillow")
+    logging.basicConfig(level=logging.INFO)
+
+    with SessionLocal() as db:
+        names = db.scalars(select(models.Item.image_name).where(models.Item.image_name.is_not(None))).all()
+    present = [name for name in names if os.path.exists(os.path.join(IMAGES_DIR, name))]
+    report = backfill(present, force=options.force)
+    report["missing_originals"] = len(set(names)) - len(set(present))
+    print(report)
+    shutdown_pool()
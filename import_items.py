@@ -0,0 +1,36 @@
+import argparse
+import json
+import sys
+
+from database import engine
+import catalog_import
+from init_db import init_db
+
+
+def main():
+    """
+    A command-line script to create or update catalog items in bulk from a
+    CSV or NDJSON file (see catalog_import for the columns).
+    """
+    parser = argparse.ArgumentParser(description="Bulk import catalog items from a CSV or NDJSON file.")
+    parser.add_argument("path", help="file to import")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="default: guessed from the file extension")
+    parser.add_argument("--batch-size", type=int, default=catalog_import.IMPORT_BATCH_SIZE,
+                        help="rows per transaction (default: %(default)s)")
+    options = parser.parse_args()
+
+    import_format = options.format or catalog_import.guess_format(options.path)
+    if import_format is None:
+        parser.error("can't tell the format from the file name; pass --format")
+
+    with open(options.path, "rb") as source:
+        report = catalog_import.import_file(source, import_format, batch_size=options.batch_size)
+    print(json.dumps(report, indent=2))
+    # Running servers drop the affected cached pages within INVALIDATION_POLL_INTERVAL seconds.
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    # Create the database tables (and search index) if they don't exist
+    init_db(engine)
+    sys.exit(main())
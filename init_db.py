@@ -0,0 +1,58 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from dotenv import load_dotenv
+from sqlalchemy import inspect
+
+import models
+import search
+import stats
+from database import engine as default_engine
+
+load_dotenv()
+
+# Each API process migrates the schema on import unless this is false. With
+# several workers (serve.py), the schema is migrated once before they start.
+DB_AUTO_INIT = os.getenv("DB_AUTO_INIT", "true").lower() in ("1", "true", "yes")
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+# The schema of databases created before migrations existed (migrations/versions/0001_baseline.py).
+BASELINE_REVISION = "0001"
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config(ALEMBIC_INI)
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def migrate(engine=default_engine) -> None:
+    """
+    Upgrades the schema to the newest migration. An empty database gets the
+    current models and is stamped as up to date; one created by create_all
+    before migrations existed is stamped at the baseline and upgraded.
+    """
+    with engine.begin() as connection:
+        config = alembic_config(connection)
+        if MigrationContext.configure(connection).get_current_revision() is None:
+            if not set(inspect(connection).get_table_names()) & set(models.Base.metadata.tables):
+                models.Base.metadata.create_all(bind=connection)
+                command.stamp(config, "head")
+                return
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
+
+
+def init_db(engine=default_engine):
+    """Migrates the schema, then creates the search index and the stats counters if missing; safe to run again."""
+    migrate(engine)
+    search.install_fts(engine)
+    stats.ensure_initialized(engine)
+
+
+if __name__ == "__main__":
+    init_db()
+    print(f"Database ready: {default_engine.url.render_as_string(hide_password=True)}")
@@ -0,0 +1,203 @@
+import logging
+import os
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, event, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+import auth
+import cache
+import jobs
+import models
+from database import SessionLocal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Every API process keeps its own catalog and principal caches. Writers record
+# what they changed in the cache_invalidations table, in the same transaction
+# as the change, and each process replays the other processes' records every
+# INVALIDATION_POLL_INTERVAL seconds: the most a worker's cache lags behind.
+# 0 turns the listener off (a single process, with no edits from the CLI tools).
+INVALIDATION_POLL_INTERVAL = float(os.getenv("INVALIDATION_POLL_INTERVAL", "1"))
+# Records newer than this are read again on every poll, in case a transaction
+# that took a lower id committed after a higher one (possible on PostgreSQL).
+LATE_COMMIT_GRACE = timedelta(seconds=10)
+RETENTION = timedelta(hours=1)
+# Principal changes are kept as long as a token issued before them is valid,
+# so a process started later still knows which tokens carry stale claims.
+PRINCIPAL_RETENTION = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+
+ORIGIN = secrets.token_hex(8)  # this process
+
+CATALOG_KINDS = ("items", "listings", "catalog")
+
+table = models.CacheInvalidation.__table__
+
+_wake = threading.Event()
+_listening = False
+_catalog_version = 0
+
+
+def _invalidate_listings(categories):
+    for category in categories:
+        cache.invalidate_listings(category)
+
+
+def _invalidate_principals(user_ids):
+    for user_id in user_ids:
+        auth.invalidate_principal(user_id)
+
+
+APPLY = {
+    "items": cache.invalidate_items,
+    "listings": _invalidate_listings,
+    "catalog": lambda keys: cache.catalog_cache.clear(),
+    "principals": _invalidate_principals,
+}
+
+
+def publish(session: Session, kind: str, keys=()) -> None:
+    """
+    Records a change for the other processes, in the session's transaction
+    (via session.run_sync for async sessions); the caller commits, then applies
+    the change to its own caches as usual.
+    """
+    session.execute(insert(table), {
+        "origin": ORIGIN, "kind": kind, "keys": list(keys), "created_at": datetime.utcnow(),
+    })
+    session.info["invalidations_published"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_listener(session):
+    # Our own records advance this process's catalog version too; fetch them now.
+    if session.info.pop("invalidations_published", False):
+        _wake.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_published(session):
+    session.info.pop("invalidations_published", None)
+
+
+def listening() -> bool:
+    """Whether this process applies the changes other processes record."""
+    return _listening
+
+
+def catalog_version() -> str:
+    """
+    The id of the newest catalog change this process has applied: the same in
+    every process once they have caught up, so catalog ETags are valid across
+    workers. Without a listener, this process's own cache generation.
+    """
+    if _listening:
+        return str(_catalog_version)
+    return f"{ORIGIN}.{cache.catalog_cache.generation}"
+
+
+class Listener:
+    """A thread that applies the changes recorded by other processes to this one's caches."""
+
+    def __init__(self, session_factory=SessionLocal, interval: float = INVALIDATION_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._last_id = 0
+        self._recent = {}  # id -> created_at of records within LATE_COMMIT_GRACE
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        global _catalog_version, _listening
+        with self.session_factory() as session:
+            self._last_id = session.scalar(select(func.max(table.c.id))) or 0
+            _catalog_version = session.scalar(
+                select(func.max(table.c.id)).where(table.c.kind.in_(CATALOG_KINDS))
+            ) or 0
+            # Tokens issued before these changes may carry a role the user no longer has.
+            for keys in session.scalars(select(table.c["keys"]).where(table.c.kind == "principals")):
+                _invalidate_principals(keys)
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+        _listening = True
+
+    def stop(self, timeout: float = 5):
+        global _listening
+        _listening = False
+        self._stopping.set()
+        _wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Polling cache invalidations failed")
+            if _wake.wait(self.interval):
+                _wake.clear()
+
+    def poll(self) -> int:
+        """Applies the records not seen yet; returns how many."""
+        global _catalog_version
+        now = datetime.utcnow()
+        with self.session_factory() as session:
+            rows = session.execute(
+                # (table.c.keys is the collection's keys() method, hence the subscript.)
+                select(table.c.id, table.c.origin, table.c.kind, table.c["keys"], table.c.created_at)
+                .where(or_(table.c.id > self._last_id, table.c.created_at >= now - LATE_COMMIT_GRACE))
+                .order_by(table.c.id)
+            ).all()
+        applied = 0
+        for row_id, origin, kind, keys, created_at in rows:
+            if row_id in self._recent or row_id <= self._last_id and created_at < now - LATE_COMMIT_GRACE:
+                continue
+            self._recent[row_id] = created_at
+            if origin != ORIGIN:
+                APPLY[kind](keys)
+                applied += 1
+            if kind in CATALOG_KINDS:
+                _catalog_version = max(_catalog_version, row_id)
+            self._last_id = max(self._last_id, row_id)
+        self._recent = {
+            row_id: created_at for row_id, created_at in self._recent.items() if created_at >= now - LATE_COMMIT_GRACE
+        }
+        return applied
+
+
+@jobs.housekeeping
+def purge(session: Session) -> int:
+    """Deletes records every running process has long since applied, and that no new one needs."""
+    now = datetime.utcnow()
+    return session.execute(delete(table).where(
+        table.c.created_at < now - RETENTION,
+        or_(table.c.kind != "principals", table.c.created_at < now - PRINCIPAL_RETENTION),
+    )).rowcount
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from init_db import init_db
+
+    parser = argparse.ArgumentParser(
+        description="Tell running API processes to drop cached data, e.g. after editing the database by hand.")
+    parser.add_argument("what", choices=["catalog", "principals"])
+    parser.add_argument("ids", nargs="*", type=int, help="user ids (principals only; default: every current user)")
+    options = parser.parse_args()
+
+    init_db()
+    with SessionLocal() as session:
+        if options.what == "principals" and not options.ids:
+            options.ids = session.scalars(select(models.User.id)).all()
+        publish(session, options.what, options.ids if options.what == "principals" else ())
+        session.commit()
+    print(f"Published a {options.what} invalidation; API processes apply it within {INVALIDATION_POLL_INTERVAL} s")
@@ -0,0 +1,318 @@
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, delete, event, func, or_, select, update
+from sqlalchemy.orm import Session
+
+import metrics
+import models
+from database import SessionLocal, dialect_insert
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Jobs queued with enqueue() commit or roll back with the request's own
+# transaction, and are run afterwards by worker threads, either in the API
+# process or in separate `python jobs.py` processes.
+
+# Worker threads started with the API process (0 = run `python jobs.py` separately).
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Seconds an idle worker sleeps before looking again; enqueues in this process wake it at once.
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# Jobs claimed per query.
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "20"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Delay before the first retry; it doubles after every failure, up to the maximum.
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "2"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "300"))
+# A job still running after this many seconds is assumed lost (e.g. its worker
+# was killed) and is handed to another worker.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+# Finished jobs are deleted after this many days; failed ones are kept for inspection.
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+HOUSEKEEPING_INTERVAL = 3600  # seconds
+
+Job = models.Job
+jobs_table = models.Job.__table__
+
+# kind -> fn(session, payload)
+HANDLERS = {}
+# Clean-up functions run hourly by one worker: fn(session) -> rows removed.
+HOUSEKEEPING = []
+
+_wake = threading.Event()
+
+
+def handler(kind: str):
+    """Registers the decorated function as the handler for jobs of `kind`."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def housekeeping(fn):
+    """Registers `fn(session) -> int` to run hourly in the worker pool; the pool commits."""
+    HOUSEKEEPING.append(fn)
+    return fn
+
+
+def enqueue(session: Session, kind: str, payload: dict, key: str | None = None,
+            delay: float = 0, max_attempts: int = JOB_MAX_ATTEMPTS):
+    """
+    Queues a job in the session's transaction (via session.run_sync for async
+    sessions); the caller commits. A job whose `key` was already queued is not
+    added again.
+    """
+    now = datetime.utcnow()
+    insert = dialect_insert(session.get_bind())
+    session.execute(insert(jobs_table).on_conflict_do_nothing(index_elements=[jobs_table.c.idempotency_key]), {
+        "kind": kind,
+        "payload": payload,
+        "idempotency_key": key,
+        "status": "pending",
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": now + timedelta(seconds=delay),
+        "created_at": now,
+    })
+    session.info["jobs_enqueued"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_workers(session):
+    if session.info.pop("jobs_enqueued", False):
+        _wake.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_enqueued(session):
+    session.info.pop("jobs_enqueued", None)
+
+
+def _due(now: datetime):
+    return or_(
+        and_(Job.status == "pending", Job.run_at <= now),
+        and_(Job.status == "running", Job.locked_until < now),
+    )
+
+
+def claim(session: Session, limit: int = JOB_BATCH_SIZE) -> list:
+    """
+    Marks up to `limit` due jobs as running and returns them. The status is
+    checked again by the UPDATE itself, so concurrent workers never claim the
+    same job twice.
+    """
+    now = datetime.utcnow()
+    # Most polls find nothing: check with an index read first, so idle workers
+    # don't take SQLite's write lock away from checkouts and cart writes.
+    if session.scalar(select(1).where(_due(now)).limit(1)) is None:
+        session.rollback()
+        return []
+    due = select(Job.id).where(_due(now)).order_by(Job.run_at).limit(limit)
+    if session.get_bind().dialect.name == "postgresql":
+        due = due.with_for_update(skip_locked=True)
+    rows = session.execute(
+        update(jobs_table)
+        .where(jobs_table.c.id.in_(due.scalar_subquery()), _due(now))
+        .values(status="running", attempts=jobs_table.c.attempts + 1,
+                locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS))
+        .returning(jobs_table.c.id, jobs_table.c.kind, jobs_table.c.payload, jobs_table.c.attempts,
+                   jobs_table.c.max_attempts, jobs_table.c.run_at)
+    ).all()
+    session.commit()
+    return rows
+
+
+def retry_delay(attempts: int) -> float:
+    """Jittered exponential backoff after the `attempts`-th failure."""
+    delay = min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.5)
+
+
+def run_job(job, session_factory=SessionLocal) -> str:
+    """Runs one claimed job and records its outcome: "done", "retry" or "failed"."""
+    started = time.perf_counter()
+    metrics.JOB_WAIT.observe(max(0.0, (datetime.utcnow() - job.run_at).total_seconds()), job.kind)
+    with session_factory() as session:
+        try:
+            fn = HANDLERS.get(job.kind)
+            if fn is None:
+                raise LookupError(f"No handler registered for job kind {job.kind!r}")
+            fn(session, job.payload)
+            session.execute(
+                update(jobs_table).where(jobs_table.c.id == job.id)
+                .values(status="done", locked_until=None, last_error=None, finished_at=datetime.utcnow())
+            )
+            session.commit()
+            outcome = "done"
+        except Exception as e:
+            session.rollback()
+            now = datetime.utcnow()
+            if job.attempts >= job.max_attempts:
+                outcome = "failed"
+                values = {"status": "failed", "finished_at": now}
+                logger.exception("Job %s (%s) failed for good after %d attempts", job.id, job.kind, job.attempts)
+            else:
+                outcome = "retry"
+                values = {"status": "pending", "run_at": now + timedelta(seconds=retry_delay(job.attempts))}
+                logger.warning("Job %s (%s) failed on attempt %d, will retry: %s", job.id, job.kind, job.attempts, e)
+            session.execute(
+                update(jobs_table).where(jobs_table.c.id == job.id)
+                .values(locked_until=None, last_error=f"{type(e).__name__}: {e}"[:2000], **values)
+            )
+            session.commit()
+    metrics.JOBS.inc(job.kind, outcome)
+    metrics.JOB_DURATION.observe(time.perf_counter() - started, job.kind)
+    return outcome
+
+
+@housekeeping
+def purge(session: Session, older_than_days: float = JOB_RETENTION_DAYS) -> int:
+    """Deletes jobs that finished successfully more than `older_than_days` ago. Caller commits."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    result = session.execute(delete(jobs_table).where(jobs_table.c.status == "done", jobs_table.c.finished_at < cutoff))
+    return result.rowcount
+
+
+def run_pending(session_factory=SessionLocal, limit: int = JOB_BATCH_SIZE) -> int:
+    """Claims and runs one batch of due jobs in the calling thread. Returns how many ran."""
+    with session_factory() as session:
+        claimed = claim(session, limit)
+    for job in claimed:
+        run_job(job, session_factory)
+    return len(claimed)
+
+
+class WorkerPool:
+    """
+    Threads that claim due jobs and run their handlers until stopped. Delivery
+    is at least once: a handler's database changes commit together with the
+    job's completion, but anything it does outside the database (sending an
+    email) may be repeated if the process dies in between.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, session_factory=SessionLocal, poll_interval: float = JOB_POLL_INTERVAL):
+        self.workers = workers
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self._stopping = threading.Event()
+        self._threads = []
+        self._last_clean_up = 0.0
+        self._clean_up_lock = threading.Lock()
+
+    def start(self):
+        self._stopping.clear()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Started %d job workers", self.workers)
+
+    def stop(self, timeout: float = 30):
+        """Lets the running jobs finish, then stops the threads."""
+        self._stopping.set()
+        _wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                ran = run_pending(self.session_factory)
+                self._maybe_clean_up()
+            except Exception:
+                logger.exception("Job worker error")
+                ran = 0
+            if not ran and _wake.wait(self.poll_interval):
+                _wake.clear()
+
+    def _maybe_clean_up(self):
+        with self._clean_up_lock:
+            if time.monotonic() - self._last_clean_up < HOUSEKEEPING_INTERVAL:
+                return
+            self._last_clean_up = time.monotonic()
+        for fn in HOUSEKEEPING:
+            with self.session_factory() as session:
+                removed = fn(session)
+                session.commit()
+            if removed:
+                logger.info("%s.%s removed %d rows", fn.__module__, fn.__name__, removed)
+
+
+def summary(session: Session, failures: int = 20) -> dict:
+    """Job counts by kind and status, the oldest due job's wait, and the most recent failures."""
+    counts = session.execute(
+        select(Job.kind, Job.status, func.count()).group_by(Job.kind, Job.status).order_by(Job.kind, Job.status)
+    ).all()
+    oldest_due = session.scalar(select(func.min(Job.run_at)).where(Job.status == "pending"))
+    failed = session.execute(
+        select(Job.id, Job.kind, Job.attempts, Job.last_error, Job.finished_at)
+        .where(Job.status == "failed").order_by(Job.finished_at.desc()).limit(failures)
+    ).all()
+    by_kind = {}
+    for kind, job_status, count in counts:
+        by_kind.setdefault(kind, {})[job_status] = count
+    return {
+        "counts": by_kind,
+        "oldest_pending_seconds": (
+            max(0.0, (datetime.utcnow() - oldest_due).total_seconds()) if oldest_due is not None else None
+        ),
+        "recent_failures": [row._asdict() for row in failed],
+    }
+
+
+def retry(session: Session, job_id: int) -> bool:
+    """Queues a failed job to run again with a fresh set of attempts. Caller commits."""
+    result = session.execute(
+        update(jobs_table).where(jobs_table.c.id == job_id, jobs_table.c.status == "failed")
+        .values(status="pending", attempts=0, run_at=datetime.utcnow(), finished_at=None)
+    )
+    session.info["jobs_enqueued"] = True
+    return result.rowcount == 1
+
+
+if __name__ == "__main__":
+    import argparse
+    import signal
+
+    # The registries this script's workers use are those of the imported module,
+    # which is what the modules below register into, not this __main__ copy.
+    import jobs
+    import idempotency  # noqa: F401  (registers its clean-up)
+    import imaging
+    import invalidation  # noqa: F401  (registers its clean-up)
+    import tasks  # noqa: F401  (registers the handlers)
+    from database import engine
+    from init_db import init_db
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Run background job workers outside the API process.")
+    parser.add_argument("--workers", type=int, default=max(jobs.JOB_WORKERS, 1))
+    parser.add_argument("--once", action="store_true", help="run the jobs that are due now, then exit")
+    options = parser.parse_args()
+
+    init_db(engine)
+    if options.once:
+        total = 0
+        while ran := jobs.run_pending():
+            total += ran
+        print(f"Ran {total} jobs")
+    else:
+        pool = jobs.WorkerPool(options.workers, poll_interval=jobs.JOB_POLL_INTERVAL)
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+        pool.start()
+        try:
+            stopped.wait()
+        except KeyboardInterrupt:
+            pass
+        pool.stop()
+        imaging.shutdown_pool()
@@ -1,24 +1,43 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Form, File, UploadFile
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Form, File, UploadFile, Query, Header
 from fastapi.security import OAuth2PasswordRequestForm, HTTPBearer,HTTPAuthorizationCredentials
 from typing import Annotated
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from fastapi.staticfiles import StaticFiles
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import select
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import timedelta
-import schemas,auth,models
-from database import SessionLocal, engine, Base
+from fastapi.concurrency import run_in_threadpool
+import schemas,auth,models,catalog,search,cache,checkout,stats,backoffice,uploads,imaging,http_cache,serialization,compression,catalog_import,carts,metrics,profiling,jobs,tasks,idempotency,ratelimit,invalidation,init_db
+from cache import catalog_cache
+from database import engine, async_engine, get_db, session_scope, log_engine_settings
+from contextlib import asynccontextmanager
+from datetime import datetime
 import logging
+import secrets
 from jose import JWTError, jwt
 import os
-import shutil
-import uuid
 
 
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_engine_settings()
+    workers = jobs.WorkerPool(jobs.JOB_WORKERS)
+    workers.start()
+    listener = invalidation.Listener() if invalidation.INVALIDATION_POLL_INTERVAL > 0 else None
+    if listener is not None:
+        await run_in_threadpool(listener.start)
+    yield
+    if listener is not None:
+        await run_in_threadpool(listener.stop)
+    await run_in_threadpool(workers.stop)
+    imaging.shutdown_pool()
+
+
+# Responses without a response model (stats, cache counters) are encoded with orjson.
+app = FastAPI(lifespan=lifespan, default_response_class=serialization.FastJSONResponse)
 origins = ["http://localhost:5173"]
 
 
@@ -29,9 +48,26 @@ app.add_middleware(
     allow_methods=["*"],           # Allows all methods (GET, POST, etc.)
     allow_headers=["*"],           # Allows all headers
 )
-
-
-Base.metadata.create_all(bind=engine)
+if compression.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
+profiling.instrument_engine(engine)
+if async_engine is not None:
+    profiling.instrument_engine(async_engine.sync_engine)
+if metrics.METRICS_ENABLED:
+    # Added last, so it is outermost and its timings include the other middleware.
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.instrument_engine(engine)
+    if async_engine is not None:
+        metrics.instrument_engine(async_engine.sync_engine)
+    metrics.register_cache("catalog", catalog_cache)
+    metrics.register_cache("principal", auth.principal_cache)
+
+
+if init_db.DB_AUTO_INIT:
+    init_db.init_db(engine)
+else:
+    search.detect_fts(engine)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -41,35 +77,44 @@ logging.basicConfig(
 logger = logging.getLogger("AUTH_DEBUG")
 
 
-IMAGES_UPLOAD_DIR = "images"
+IMAGES_UPLOAD_DIR = imaging.IMAGES_DIR
 
 os.makedirs(IMAGES_UPLOAD_DIR, exist_ok=True)
 
-app.mount(f"/{IMAGES_UPLOAD_DIR}", StaticFiles(directory=IMAGES_UPLOAD_DIR), name="images")
+app.mount(f"/{IMAGES_UPLOAD_DIR}", http_cache.ImmutableStaticFiles(directory=IMAGES_UPLOAD_DIR), name="images")
 
 security = HTTPBearer(auto_error=False)
 
-def get_db():
-    """Dependency to get the database session."""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_user(db: Session, email: str):
+async def get_user(db: AsyncSession, email: str):
     """Fetch a user by email from the database."""
-    return db.query(models.User).filter(models.User.email == email).first() 
-
-
+    return await db.scalar(select(models.User).where(models.User.email == email))
+
+
+
+async def load_principal(db: AsyncSession, user_id: int | None, email: str) -> auth.Principal | None:
+    """Reads the user behind a token and caches them as a principal."""
+    # Captured before reading: a role change invalidated meanwhile keeps this
+    # (possibly older) row out of the cache.
+    generation = auth.principal_cache.generation
+    if user_id is not None:
+        user = await db.get(models.User, user_id)
+    else:
+        # Tokens issued before the uid claim existed only carry the email.
+        user = await get_user(db, email=email)
+    if user is None or user.email != email:
+        return None
+    principal = auth.Principal.from_user(user)
+    auth.principal_cache.set(user.id, principal, generation=generation)
+    return principal
 
 async def get_current_active_user(
-    # Correctly type hint the dependency result as an object
     auth_credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> models.User:
+    db: AsyncSession = Depends(get_db)
+) -> auth.Principal:
     """
-    Decodes JWT token to get the current active user.
+    Decodes the JWT and returns the authenticated principal: from the token's
+    id and role claims while they are current (auth.claims_principal), else
+    from the principal cache or the users table.
     """
     if auth_credentials is None:
         raise HTTPException(
@@ -78,10 +123,6 @@ async def get_current_active_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # The token is a string inside the .credentials attribute
-    token = auth_credentials.credentials
-    logger.info(f"🎫 Token received (first 20 chars): {token[:20]}...")
-
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -89,34 +130,40 @@ async def get_current_active_user(
     )
     
     try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str | None = payload.get("sub")
-        
-        if email is None:
-            logger.error("❌ 'sub' claim (email) not found in token payload")
-            raise credentials_exception
-            
+        payload = jwt.decode(auth_credentials.credentials, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
     except JWTError as e:
-        logger.error(f"❌ JWT decode error: {e}")
+        logger.warning("JWT decode error: %s", e)
         raise credentials_exception
-    
-    user = get_user(db, email=email)
-    
-    if user is None:
-        logger.error(f"❌ User '{email}' not found in database")
+
+    email: str | None = payload.get("sub")
+    user_id: int | None = payload.get("uid")
+    if email is None:
+        logger.warning("'sub' claim (email) not found in token payload")
         raise credentials_exception
-        
-    logger.info(f"✅ User authenticated successfully: {user.email}")
-    return user
+
+    if invalidation.listening():
+        principal = auth.claims_principal(payload)
+        if principal is not None:
+            return principal
+    principal = auth.principal_cache.get(user_id) if user_id is not None else None
+    if principal is None:
+        principal = await load_principal(db, user_id, email)
+    elif principal.email != email:
+        principal = None
+    if principal is None:
+        logger.warning("User for token subject %r not found", email)
+        raise credentials_exception
+    return principal
 
 @app.get("/users/me", response_model=schemas.S_User, tags=["Authentication"])
 async def read_users_me(
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: auth.Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    return current_user
+    return await db.get(models.User, current_user.id)
 
-def get_current_admin_user(user : models.User = Depends(get_current_active_user)):
-    """Dependency to ensure the current user is an admin."""
+async def get_current_admin_user(user: auth.Principal = Depends(get_current_active_user)):
+    """Dependency to ensure the current user is an admin; see get_current_active_user for where the role comes from."""
     if user.role != 'admin':
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -125,54 +172,63 @@ def get_current_admin_user(user : models.User = Depends(get_current_active_user)
         )
     return user
 
-@app.post("/register", response_model=schemas.S_User, tags=["Authentication"])
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+@app.post("/register", response_model=schemas.S_User, tags=["Authentication"],
+          dependencies=[Depends(ratelimit.per_ip(ratelimit.REGISTER_PER_IP))])
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     """Registers a new user, hashes their password, and sets default roles."""
     if user.password != user.confirmPassword:
         raise HTTPException(status_code=400, detail="Passwords do not match")
-    if get_user(db, email=user.email):
+    if await get_user(db, email=user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     db_user = models.User(
         email=user.email,
         full_name=user.full_name,
-        password=auth.get_password_hash(user.password),
+        password=await auth.aget_password_hash(user.password),
         role='consumer' # All new users are consumers by default
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.run_sync(stats.record_user_created)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-@app.post("/token", response_model=schemas.Token, tags=["Authentication"])
+@app.post("/token", response_model=schemas.Token, tags=["Authentication"],
+          dependencies=[Depends(ratelimit.per_ip(ratelimit.LOGIN_PER_IP))])
 async def login(
     # This is the crucial change. It correctly reads the form data.
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()], 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    """
+    Issues an access token. The database lookup and bcrypt check both run off
+    the event loop, so logins don't stall other requests. Attempts are limited
+    per client IP and per account (429 with Retry-After), before any bcrypt work.
+    """
+    await ratelimit.check(ratelimit.LOGIN_PER_ACCOUNT, form_data.username.strip().lower())
+    user = await get_user(db, form_data.username)
     
-    user = get_user(db, email=form_data.username)
-    
-    # 4. Use form_data.password for the password
-    if not user or not auth.verify_password(form_data.password, user.password):
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await auth.averify_and_update(form_data.password, user.password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"}, 
         )
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
     
-    
-    access_token = auth.create_access_token(
-        data={"sub": user.email}, 
-        expires_delta=timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
+    access_token = auth.create_user_token(user)
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/admin/create/items", response_model=schemas.Item, tags=["Admin"])
-def create_item(
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_admin_user),
+async def create_item(
+    db: AsyncSession = Depends(get_db),
+    user: auth.Principal = Depends(get_current_admin_user),
     # Change from a single JSON body to form fields
     name: str = Form(...),
     description: str = Form(...),
@@ -187,16 +243,11 @@ def create_item(
     """
     if price < 0 or quantity < 0:
         raise HTTPException(status_code=400, detail="Price and quantity must be positive integers")
-    # 1. Generate a unique filename to prevent conflicts
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(IMAGES_UPLOAD_DIR, unique_filename)
-
-    # 2. Save the uploaded file to the server
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # 1. Stream the image to disk under a name derived from its content, so
+    #    identical images share one file (413 if too large, 415 if not an image)
+    image_name = await uploads.save_image(file, IMAGES_UPLOAD_DIR)
 
-    # 3. Create a dictionary with the item data from the form
+    # 2. Create a dictionary with the item data from the form
     item_data = {
         "name": name,
         "description": description,
@@ -205,88 +256,235 @@ def create_item(
         "category": category
     }
 
-    # 4. Create the SQLAlchemy model instance
-    db_item = models.Item(**item_data, image_name=unique_filename)
+    # 3. Create the SQLAlchemy model instance
+    db_item = models.Item(**item_data, image_name=image_name)
     
-    # 5. Add to the database and commit
+    # 4. Add to the database and commit
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.run_sync(stats.record_item_created)
+    if imaging.IMAGE_VARIANTS_ENABLED:
+        # Thumbnails are made by a job worker; the response doesn't wait for them.
+        await db.run_sync(
+            jobs.enqueue, tasks.IMAGE_VARIANTS, {"image_name": image_name}, key=f"{tasks.IMAGE_VARIANTS}:{image_name}"
+        )
+    await db.run_sync(invalidation.publish, "listings", [db_item.category])
+    await db.commit()
+    await db.refresh(db_item)
+    cache.invalidate_listings(db_item.category)
     
     return db_item
 
 
-@app.get("/items", response_model=list[schemas.Item])
-def get_items(db: Session = Depends(get_db)):
-    """Retrieves the latest 5 items from the database."""
-    items = db.query(models.Item).all()
-    return items
+@app.post("/admin/items/import", response_model=schemas.ImportReport, tags=["Admin"])
+async def import_items(
+    db: AsyncSession = Depends(get_db),
+    user: auth.Principal = Depends(get_current_admin_user),
+    file: UploadFile = File(...),
+    format: catalog_import.ImportFormat | None = None,
+):
+    """
+    Creates or updates items in bulk from a CSV or NDJSON file with the item
+    fields plus optional id and image_name columns. Rows with an id update that
+    item; invalid rows are listed in the report and the rest are still imported.
+    """
+    import_format = format or catalog_import.guess_format(file.filename, file.content_type)
+    if import_format is None:
+        raise HTTPException(status_code=400, detail="Unknown file format; pass format=csv or format=ndjson")
+    # The import opens its own session per batch.
+    await db.close()
+    # The upload is already spooled to a temporary file; it is parsed a line at a time.
+    return await run_in_threadpool(catalog_import.import_file, file.file, import_format)
+
 
-@app.get("/items/men", response_model=list[schemas.Item])
-def get_men_items(db: Session = Depends(get_db)):
-    items = db.query(models.Item).filter(models.Item.category == "Men").all()
-    return items
+def json_bytes_response(body: bytes, headers: dict | None = None) -> Response:
+    return Response(content=body, media_type="application/json", headers=headers)
 
-@app.get("/items/women", response_model=list[schemas.Item])
-def get_women_items(db: Session = Depends(get_db)):
-    items = db.query(models.Item).filter(models.Item.category == "Women").all()
-    return items
+def catalog_response(request: Request, version: str, cached_body: bytes | None = None):
+    """
+    Checks a catalog request against the catalog version it will be answered at.
+    Returns a ready response (304, or a cache hit) or None, plus the caching headers.
+    Call it once the request is known to have an answer (valid parameters, an
+    existing item), so a matching If-None-Match doesn't turn a 400 or 404 into a 304.
+    """
+    etag = http_cache.catalog_etag(version)
+    headers = {"ETag": etag, "Cache-Control": http_cache.catalog_cache_control()}
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag, headers["Cache-Control"]), headers
+    if cached_body is not None:
+        return json_bytes_response(cached_body, headers), headers
+    return None, headers
+
+async def list_catalog_page(request: Request, db: AsyncSession, **filters):
+    """
+    Runs a catalog listing query, turning a bad cursor into a 400.
+    Pages are served from the catalog cache as pre-serialized JSON when possible,
+    and revalidated with If-None-Match without touching the database.
+    """
+    # Captured before reading: if the catalog changes meanwhile, this answer carries
+    # the older version and the client fetches it again.
+    version = invalidation.catalog_version()
+    generation = catalog_cache.generation
+    try:
+        if filters.get("cursor") is not None:
+            catalog.decode_cursor(filters["sort"], filters["cursor"])
+    except catalog.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    key = ("items", *sorted(filters.items()))
+    response, headers = catalog_response(request, version, catalog_cache.get(key))
+    if response is not None:
+        return response
+
+    items, next_cursor = await db.run_sync(catalog.list_items, **filters)
+    body = serialization.dump_json(schemas.ItemPage, {"items": items, "next_cursor": next_cursor})
+    tags = [cache.listing_tag(filters.get("category"))]
+    tags += [cache.item_tag(item.id) for item in items]
+    catalog_cache.set(key, body, tags=tags, generation=generation)
+    return json_bytes_response(body, headers)
+
+@app.get("/items", response_model=schemas.ItemPage)
+async def get_items(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(catalog.DEFAULT_PAGE_SIZE, ge=1, le=catalog.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    sort: catalog.SortOption = "newest",
+    category: str | None = None,
+    min_price: int | None = Query(None, ge=0),
+    max_price: int | None = Query(None, ge=0),
+    in_stock: bool = False,
+):
+    """
+    Lists catalog items one page at a time.
+    Pass the returned `next_cursor` back as `cursor` to fetch the following page.
+    """
+    return await list_catalog_page(
+        request,
+        db,
+        limit=limit,
+        cursor=cursor,
+        sort=sort,
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+    )
 
-@app.get("/items/accessories", response_model=list[schemas.Item])
-def get_accessories_items(db: Session = Depends(get_db)):
-    items = db.query(models.Item).filter(models.Item.category == "Accessories").all()
-    return items
+@app.get("/items/men", response_model=schemas.ItemPage)
+async def get_men_items(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(catalog.DEFAULT_PAGE_SIZE, ge=1, le=catalog.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    sort: catalog.SortOption = "newest",
+):
+    return await list_catalog_page(request, db, limit=limit, cursor=cursor, sort=sort, category="Men")
+
+@app.get("/items/women", response_model=schemas.ItemPage)
+async def get_women_items(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(catalog.DEFAULT_PAGE_SIZE, ge=1, le=catalog.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    sort: catalog.SortOption = "newest",
+):
+    return await list_catalog_page(request, db, limit=limit, cursor=cursor, sort=sort, category="Women")
+
+@app.get("/items/accessories", response_model=schemas.ItemPage)
+async def get_accessories_items(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(catalog.DEFAULT_PAGE_SIZE, ge=1, le=catalog.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    sort: catalog.SortOption = "newest",
+):
+    return await list_catalog_page(request, db, limit=limit, cursor=cursor, sort=sort, category="Accessories")
 
 @app.get("/items/{item_id}", response_model=schemas.Item)
-def get_item(item_id: int, db: Session = Depends(get_db)):
+async def get_item(item_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     """Retrieves a specific item by its ID."""
-    item = db.query(models.Item).filter(models.Item.id == item_id).first()
+    version = invalidation.catalog_version()
+    generation = catalog_cache.generation
+    key = ("item", item_id)
+    cached_body = catalog_cache.get(key)
+    if cached_body is not None:
+        return catalog_response(request, version, cached_body)[0]
+
+    item = await db.get(models.Item, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    return item
-
-@app.get("/search/items", response_model=list[schemas.Item])
-def search_items(q: str, db: Session = Depends(get_db)):
+    response, headers = catalog_response(request, version)
+    if response is not None:
+        return response
+    body = serialization.dump_json(schemas.Item, item)
+    catalog_cache.set(key, body, tags=[cache.item_tag(item.id)], generation=generation)
+    return json_bytes_response(body, headers)
+
+@app.get("/search/items", response_model=list[schemas.Item],
+         dependencies=[Depends(ratelimit.per_ip(ratelimit.SEARCH_PER_IP))])
+async def search_items(
+    q: str,
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(catalog.DEFAULT_PAGE_SIZE, ge=1, le=catalog.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
     """
-    Searches for items by name, case-insensitively.
+    Searches items by name, description and category, best matches first.
+    The last word is matched as a prefix, so partial input autocompletes.
     """
-    # The '%' are wildcards, so it finds partial matches
-    search_query = f"%{q}%"
-    
-    # Use .ilike() for case-insensitive partial matching
-    items = db.query(models.Item).filter(models.Item.name.ilike(search_query)).all()
-    
-    return items
+    items = await db.run_sync(search.search_items, q, limit=limit, offset=offset)
+    return json_bytes_response(serialization.dump_json(list[schemas.Item], items))
 
 
 @app.post("/user/cart", response_model=schemas.Cart, tags=["Cart"])
-def add_to_cart(cart: schemas.CartCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    user_cart = models.Cart(
-        user_id=current_user.id,
-        item_id=cart.item_id,
-        quantity=cart.quantity
-    )
-    db.add(user_cart)
-    db.commit()
-    db.refresh(user_cart)
-    return user_cart
-
-@app.get("/user/orders", response_model=list[schemas.Order], tags=["Order"])
-def get_user_orders(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    """Retrieves the current user's orders."""
-    orders = db.query(models.Order).filter(models.Order.customer_id == current_user.id).all()
-    return orders
-
-@app.get("/user/cart", response_model=list[schemas.Cart], tags=["Cart"])
-def get_cart(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    """Retrieves the current user's cart."""
-    cart_items = db.query(models.Cart).filter(models.Cart.user_id == current_user.id).all()
-    return cart_items
+async def add_to_cart(cart: schemas.CartCreate, db: AsyncSession = Depends(get_db), current_user: auth.Principal = Depends(get_current_active_user)):
+    """Adds an item to the cart; if it is already there, its quantity is increased."""
+    line = await carts.add_item(db, current_user.id, cart.item_id, cart.quantity)
+    if line is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    await db.commit()
+    return line
+
+@app.post("/user/cart/batch", response_model=list[schemas.CartLine], tags=["Cart"])
+async def update_cart(batch: schemas.CartBatch, db: AsyncSession = Depends(get_db), current_user: auth.Principal = Depends(get_current_active_user)):
+    """
+    Applies several cart changes at once, all or nothing, and returns the updated cart.
+    Each operation adds to an item's quantity or, with mode "set", replaces it.
+    """
+    await carts.apply_operations(db, current_user.id, batch.operations)
+    await db.commit()
+    return await carts.read_cart(db, current_user.id)
+
+@app.put("/user/cart/items/{item_id}", response_model=list[schemas.CartLine], tags=["Cart"])
+async def set_cart_quantity(item_id: int, cart: schemas.CartQuantity, db: AsyncSession = Depends(get_db), current_user: auth.Principal = Depends(get_current_active_user)):
+    """Sets how many units of an item are in the cart (0 removes it) and returns the updated cart."""
+    operation = schemas.CartOperation(item_id=item_id, quantity=cart.quantity, mode="set")
+    await carts.apply_operations(db, current_user.id, [operation])
+    await db.commit()
+    return await carts.read_cart(db, current_user.id)
+
+@app.get("/user/orders", response_model=list[schemas.OrderDetail], tags=["Order"])
+async def get_user_orders(db: AsyncSession = Depends(get_db), current_user: auth.Principal = Depends(get_current_active_user)):
+    """Retrieves the current user's orders with their line items (two queries in total)."""
+    orders = (await db.scalars(
+        select(models.Order)
+        .options(selectinload(models.Order.items))
+        .where(models.Order.customer_id == current_user.id)
+    )).all()
+    return json_bytes_response(serialization.dump_json(list[schemas.OrderDetail], orders))
+
+@app.get("/user/cart", response_model=list[schemas.CartLine], tags=["Cart"])
+async def get_cart(db: AsyncSession = Depends(get_db), current_user: auth.Principal = Depends(get_current_active_user)):
+    """Retrieves the current user's cart with each item's current price and stock."""
+    return await carts.read_cart(db, current_user.id)
 
 @app.get("/user/order/items/{order_id}", response_model=list[schemas.OrderItem], tags=["Order"])
-def get_order_items(order_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+async def get_order_items(order_id: int, db: AsyncSession = Depends(get_db), current_user: auth.Principal = Depends(get_current_active_user)):
     """Retrieves the items for a specific order."""
-    order = db.query(models.Order).filter(models.Order.id == order_id, models.Order.customer_id == current_user.id).first()
+    order = await db.scalar(
+        select(models.Order)
+        .options(selectinload(models.Order.items))
+        .where(models.Order.id == order_id, models.Order.customer_id == current_user.id)
+    )
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -295,127 +493,273 @@ def get_order_items(order_id: int, db: Session = Depends(get_db), current_user:
 
 
 @app.delete("/user/cart/{cart_item_id}", response_model=schemas.Cart, tags=["Cart"])
-def remove_from_cart(cart_item_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+async def remove_from_cart(cart_item_id: int, db: AsyncSession = Depends(get_db), current_user: auth.Principal = Depends(get_current_active_user)):
     """Removes an item from the user's cart."""
-    cart_item = db.query(models.Cart).filter(models.Cart.id == cart_item_id, models.Cart.user_id == current_user.id).first()
+    cart_item = await db.scalar(
+        select(models.Cart).where(models.Cart.id == cart_item_id, models.Cart.user_id == current_user.id)
+    )
     
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
-    db.delete(cart_item)
-    db.commit()
+    await db.delete(cart_item)
+    await db.commit()
     return cart_item
 
 
+async def place_order(db: AsyncSession, order: schemas.OrderCreate, customer_id: int, before_commit=None):
+    try:
+        new_order, ordered_item_ids = await checkout.checkout(db, order, customer_id, before_commit)
+    except checkout.InsufficientStock as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Insufficient stock", "items": e.shortages},
+        )
+    # Stock levels changed, so cached copies of these items are stale.
+    cache.invalidate_items(ordered_item_ids)
+    return new_order
+
 @app.post("/order", response_model=schemas.Order)
-def create_order(
+async def create_order(
     order: schemas.OrderCreate, 
-    db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_db), 
+    current_user: auth.Principal = Depends(get_current_active_user),
+    idempotency_key: str | None = Header(None, min_length=1, max_length=idempotency.MAX_KEY_LENGTH),
 ):
-   
-    
-    # 1. Get all cart items for the currently authenticated user.
-    cart_items = db.query(models.Cart).filter(models.Cart.user_id == current_user.id).all()
-    
-    if not cart_items:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
-    
-    # 2. Calculate the total amount based on the prices and quantities in the cart.
-    total_amount = sum(item.item.price * item.quantity for item in cart_items)
-    
-    if total_amount <= 0:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Total amount must be positive")
-    
-    # 3. Create the main Order object with customer details.
-    new_order = models.Order(
-        customer_name=order.customer_name,
-        customer_phone=order.customer_phone,
-        customer_address=order.customer_address,
-        status="pending",  # It's best practice to set a default status on the backend.
-        total_amount=total_amount,
-        customer_id=current_user.id
-    )
-    
-    # 4. Create an OrderItem for each item in the cart and link it to the new Order.
-    # The `cascade` option in your Order model's relationship will handle adding these.
-    for item in cart_items:
-        order_item = models.OrderItem(
-            item_id=item.item_id,
-            quantity=item.quantity,
-            price=item.item.price  # Store the price at the time of the order.
-        )
-        item.item.quantity -= item.quantity
-        # By appending to the relationship, SQLAlchemy knows to link this
-        # OrderItem to the new_order when it's saved.
-        new_order.items.append(order_item)
+    """
+    Places an order for everything in the current user's cart.
+    Fails with 409 and leaves the cart untouched if any line is out of stock.
 
-    # 5. Add the new_order (which now contains its associated items) to the session.
-    db.add(new_order)
- 
-    db.query(models.Cart).filter(models.Cart.user_id == current_user.id).delete(synchronize_session=False)
+    With an Idempotency-Key header, retries of the same request get the first
+    response back (marked Idempotent-Replayed: true) without placing another
+    order, and a retry sent while the first is still running waits for it.
+    """
+    if idempotency_key is None:
+        return await place_order(db, order, current_user.id)
 
-    db.commit()
+    user_id = current_user.id
+    request_fingerprint = idempotency.fingerprint("POST /order", order.model_dump_json())
+    stored = await idempotency.begin(db, user_id, idempotency_key, request_fingerprint)
+    if stored is not None:
+        return idempotency.replay(stored)
 
-    db.refresh(new_order)
-    
-    return new_order
+    body = None
+
+    async def store_response(new_order):
+        # Saved in the checkout transaction: the order and its stored response commit together.
+        nonlocal body
+        body = serialization.dump_json(schemas.Order, new_order)
+        await idempotency.complete(db, user_id, idempotency_key, status.HTTP_200_OK, body)
+
+    try:
+        await place_order(db, order, user_id, before_commit=store_response)
+    except BaseException:
+        # Including cancellation (client gone, server stopping), or the key
+        # would stay claimed and block retries until it expires.
+        await idempotency.release(db, user_id, idempotency_key)
+        raise
+    idempotency.finished(user_id, idempotency_key)
+    return json_bytes_response(body)
 
 
 @app.get("/admin/stats", tags=["Admin"])
-def get_admin_stats(db: Session = Depends(get_db), user: models.User = Depends(get_current_admin_user)):
+async def get_admin_stats(db: AsyncSession = Depends(get_db), user: auth.Principal = Depends(get_current_admin_user)):
     """
-    Returns statistics for the admin dashboard.
+    Returns statistics for the admin dashboard: one primary-key read of the
+    running totals, or one aggregate query when STATS_MATERIALIZED is off.
     """
-    total_users = db.query(models.User).count()
-    total_items = db.query(models.Item).count()
-    total_orders = db.query(models.Order).count()
-    total_revenue = db.query(models.Order).filter(models.Order.status == "completed").with_entities(func.sum(models.Order.total_amount)).scalar() or 0
-    
+    return await db.run_sync(stats.read_totals)
+
+@app.get("/admin/stats/series", tags=["Admin"])
+async def get_admin_stats_series(
+    period: stats.Period = "daily",
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_db),
+    user: auth.Principal = Depends(get_current_admin_user),
+):
+    """Orders and completed revenue per day or week over the last `days` days, for dashboard charts."""
+    return await db.run_sync(stats.read_series, period, days)
+
+@app.get("/admin/cache/stats", tags=["Admin"])
+async def get_cache_stats(user: auth.Principal = Depends(get_current_admin_user)):
+    """Hit/miss/eviction counters for the catalog read cache."""
+    return catalog_cache.stats()
+
+@app.get("/admin/profiling", tags=["Admin"])
+async def get_profiling(user: auth.Principal = Depends(get_current_admin_user)):
+    """The profiler's sample rate and the most recent profiles taken by this process."""
     return {
-        "total_users": total_users,
-        "total_items": total_items,
-        "total_orders": total_orders,
-        "total_revenue": total_revenue
+        "available": profiling.Profiler is not None,
+        "sample_rate": profiling.profile_store.sample_rate,
+        "profiles": profiling.profile_store.list(),
     }
 
-@app.get("/admin/orders", response_model=list[schemas.Order], tags=["Admin"])
-def get_admin_orders(db: Session = Depends(get_db), user: models.User = Depends(get_current_admin_user)):
-   
-    orders = db.query(models.Order).all()
-    return orders
-
-@app.get("/admin/users", response_model=list[schemas.S_User], tags=["Admin"])
-def get_admin_users(db: Session = Depends(get_db), user: models.User = Depends(get_current_admin_user)):
-    """Retrieves all users for admin view."""
-    users = db.query(models.User).filter(models.User.role != 'admin').all()
-    
-    return users
+@app.put("/admin/profiling", tags=["Admin"])
+async def set_profiling(settings: schemas.ProfilingSettings, user: auth.Principal = Depends(get_current_admin_user)):
+    """
+    Profiles the given fraction of this process's requests from now on.
+    Needs pyinstrument; each profile is saved as speedscope JSON (https://www.speedscope.app).
+    """
+    if settings.sample_rate > 0 and profiling.Profiler is None:
+        raise HTTPException(status_code=409, detail="Profiling needs pyinstrument: pip install pyinstrument")
+    profiling.profile_store.sample_rate = settings.sample_rate
+    return await get_profiling(user)
+
+@app.get("/admin/profiling/{name}", tags=["Admin"])
+async def download_profile(name: str, user: auth.Principal = Depends(get_current_admin_user)):
+    """Downloads one profile, ready to open in speedscope."""
+    path = profiling.profile_store.path(name)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=name)
+
+@app.get("/admin/slow-queries", tags=["Admin"])
+async def get_slow_queries(user: auth.Principal = Depends(get_current_admin_user)):
+    """
+    Statements slower than SLOW_QUERY_MS seen by this process: totals per
+    statement (with its query plan), worst first, and the most recent occurrences.
+    """
+    return profiling.slow_query_log.report()
+
+@app.delete("/admin/slow-queries", tags=["Admin"])
+async def clear_slow_queries(user: auth.Principal = Depends(get_current_admin_user)):
+    profiling.slow_query_log.clear()
+    return {"cleared": True}
+
+@app.get("/admin/jobs", tags=["Admin"])
+async def get_jobs(db: AsyncSession = Depends(get_db), user: auth.Principal = Depends(get_current_admin_user)):
+    """Background job counts by kind and status, how long the oldest pending job has waited, and recent failures."""
+    return await db.run_sync(jobs.summary)
+
+@app.post("/admin/jobs/{job_id}/retry", tags=["Admin"])
+async def retry_job(job_id: int, db: AsyncSession = Depends(get_db), user: auth.Principal = Depends(get_current_admin_user)):
+    """Runs a job that failed for good once more, with a fresh set of attempts."""
+    if not await db.run_sync(jobs.retry, job_id):
+        raise HTTPException(status_code=404, detail="No failed job with this id")
+    await db.commit()
+    return {"id": job_id, "status": "pending"}
+
+@app.get("/admin/orders", response_model=schemas.OrderPage, tags=["Admin"])
+async def get_admin_orders(
+    db: AsyncSession = Depends(get_db),
+    user: auth.Principal = Depends(get_current_admin_user),
+    limit: int = Query(backoffice.DEFAULT_PAGE_SIZE, ge=1, le=backoffice.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    status: str | None = None,
+    customer_id: int | None = None,
+    placed_from: datetime | None = None,
+    placed_to: datetime | None = None,
+):
+    """
+    Lists orders newest first, one page at a time, optionally filtered by status,
+    customer and order date (`placed_to` is exclusive).
+    Pass the returned `next_cursor` back as `cursor` to fetch the following page.
+    """
+    try:
+        orders, next_cursor = await db.run_sync(
+            backoffice.list_orders,
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            customer_id=customer_id,
+            placed_from=placed_from,
+            placed_to=placed_to,
+        )
+    except catalog.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return json_bytes_response(serialization.dump_json(schemas.OrderPage, {"orders": orders, "next_cursor": next_cursor}))
+
+@app.get("/admin/orders/export", tags=["Admin"])
+async def export_admin_orders(
+    db: AsyncSession = Depends(get_db),
+    user: auth.Principal = Depends(get_current_admin_user),
+    format: backoffice.ExportFormat = "ndjson",
+    status: str | None = None,
+    customer_id: int | None = None,
+    placed_from: datetime | None = None,
+    placed_to: datetime | None = None,
+):
+    """Downloads every matching order as NDJSON or CSV, streamed in constant memory."""
+    # The request's own session is only needed for authentication; release it
+    # rather than holding a connection for the whole download.
+    await db.close()
+    body = backoffice.export_orders(
+        session_scope, format,
+        status=status, customer_id=customer_id, placed_from=placed_from, placed_to=placed_to,
+    )
+    return StreamingResponse(body, media_type=backoffice.MEDIA_TYPES[format], headers={
+        "Content-Disposition": f'attachment; filename="orders.{format}"',
+    })
+
+@app.get("/admin/users", response_model=schemas.UserPage, tags=["Admin"])
+async def get_admin_users(
+    db: AsyncSession = Depends(get_db),
+    user: auth.Principal = Depends(get_current_admin_user),
+    limit: int = Query(backoffice.DEFAULT_PAGE_SIZE, ge=1, le=backoffice.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+):
+    """Lists non-admin users one page at a time."""
+    try:
+        users, next_cursor = await db.run_sync(backoffice.list_users, limit=limit, cursor=cursor)
+    except catalog.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"users": users, "next_cursor": next_cursor}
+
+@app.get("/admin/users/export", tags=["Admin"])
+async def export_admin_users(
+    db: AsyncSession = Depends(get_db),
+    user: auth.Principal = Depends(get_current_admin_user),
+    format: backoffice.ExportFormat = "ndjson",
+):
+    """Downloads every non-admin user as NDJSON or CSV, streamed in constant memory."""
+    await db.close()
+    return StreamingResponse(backoffice.export_users(session_scope, format), media_type=backoffice.MEDIA_TYPES[format], headers={
+        "Content-Disposition": f'attachment; filename="users.{format}"',
+    })
 
 @app.get("/admin/order/items/{order_id}", response_model=list[schemas.OrderItem], tags=["Admin"])
-def get_admin_order_items(order_id: int, db: Session = Depends(get_db), user: models.User = Depends(get_current_admin_user)):
+async def get_admin_order_items(order_id: int, db: AsyncSession = Depends(get_db), user: auth.Principal = Depends(get_current_admin_user)):
     """Retrieves all items for a specific order."""
-    order_items = db.query(models.OrderItem).filter(models.OrderItem.order_id == order_id).all()
+    order_items = (await db.scalars(select(models.OrderItem).where(models.OrderItem.order_id == order_id))).all()
     return order_items
 
 @app.post("/admin/order/{order_id}", response_model=schemas.Order, tags=["Admin"])
-def Admin_update_order_status( 
+async def Admin_update_order_status( 
     data: schemas.AdminOrderStatus, 
-    db: Session = Depends(get_db), 
-    user: models.User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_db), 
+    user: auth.Principal = Depends(get_current_admin_user)
 ):
     """Updates the status of an order."""
-    order = db.query(models.Order).filter(models.Order.id == data.id).first()
+    order = await db.get(models.Order, data.id)
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
+    old_status = order.status
     order.status = data.status
-    db.commit()
-    db.refresh(order)
+    await db.run_sync(stats.record_status_change, order.order_date, order.total_amount, old_status, data.status)
+    if data.status != old_status:
+        # No idempotency key: the job commits with the change it reports, and an
+        # order can return to an earlier status, which is a new change to report.
+        await db.run_sync(
+            jobs.enqueue, tasks.ORDER_STATUS_CHANGED, {"order_id": order.id, "status": data.status}
+        )
+    await db.commit()
+    await db.refresh(order)
     
     return order
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """This process's request, database, bcrypt and cache metrics in Prometheus text format."""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if metrics.METRICS_TOKEN is not None and not secrets.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {metrics.METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/")
 def home():
     return "ITS REALLY RUNNING!!!!!!"
\ No newline at end of file
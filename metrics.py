@@ -0,0 +1,296 @@
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# When set, GET /metrics requires "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+# Adds a Server-Timing header (handler, database and bcrypt time) to every response.
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+INF_BUCKET = 'le="+Inf"'
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named family of time series, one per combination of label values. Thread-safe."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_number(value)}" for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]  # counts, sum, count
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items())
+        lines = self._header()
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, INF_BUCKET)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_number(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+_registry: list[_Metric] = []
+_caches = {}  # name -> TTLCache
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last byte of the response.",
+    ("method", "route"),
+)
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled.")
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements run per request.", ("method", "route"), buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram("http_request_db_seconds", "Time spent in SQL statements per request.", ("method", "route"))
+DB_QUERIES = Counter("db_queries_total", "SQL statements run, including outside requests.")
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Duration of single SQL statements.")
+BCRYPT_DURATION = Histogram(
+    "bcrypt_duration_seconds", "Time spent hashing or verifying one password.", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5),
+)
+
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests refused with 429, by limit.", ("limit",))
+JOBS = Counter("jobs_total", "Background jobs run by this process, by outcome (done, retry, failed).", ("kind", "outcome"))
+JOB_DURATION = Histogram("job_duration_seconds", "Time spent running one background job.", ("kind",))
+JOB_WAIT = Histogram(
+    "job_wait_seconds", "Time from when a job was due to when a worker picked it up.", ("kind",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+
+@dataclass
+class RequestTimings:
+    """What one request has spent so far; shared by every task and thread working on it."""
+    started: float
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    bcrypt_seconds: float = 0.0
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+def current() -> RequestTimings | None:
+    return _current.get()
+
+
+# --- Database -------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_query_started"].pop()
+    DB_QUERIES.inc()
+    DB_QUERY_DURATION.observe(elapsed)
+    timings = _current.get()
+    if timings is not None:
+        timings.db_queries += 1
+        timings.db_seconds += elapsed
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute.
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_query_started"):
+        connection.info["metrics_query_started"].pop()
+
+
+def instrument_engine(engine) -> None:
+    """Times every statement run on a sync Engine (pass async_engine.sync_engine for async ones)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+# --- Password hashing -----------------------------------------------------------
+
+def timed_hash(operation: str, fn, *args):
+    """Runs a bcrypt call, recording its duration globally and against the current request."""
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        elapsed = time.perf_counter() - started
+        BCRYPT_DURATION.observe(elapsed, operation)
+        timings = _current.get()
+        if timings is not None:
+            timings.bcrypt_seconds += elapsed
+
+
+# --- Caches ---------------------------------------------------------------------
+
+def register_cache(name: str, cache) -> None:
+    """Exports a TTLCache's counters (cache.stats()) under the label cache=<name>."""
+    _caches[name] = cache
+
+
+def _render_caches() -> list[str]:
+    if not _caches:
+        return []
+    stats = {name: cache.stats() for name, cache in sorted(_caches.items())}
+    lines = []
+    for key, type_name, documentation in (
+        ("hits", "counter", "Cache lookups that found a live entry."),
+        ("misses", "counter", "Cache lookups that found nothing or an expired entry."),
+        ("evictions", "counter", "Entries dropped to make room."),
+        ("invalidations", "counter", "Entries dropped because the data behind them changed."),
+        ("entries", "gauge", "Entries currently cached."),
+        ("bytes", "gauge", "Size of the cached values, for caches bounded by bytes."),
+        ("hit_rate", "gauge", "hits / (hits + misses) since startup."),
+    ):
+        name = f"cache_{key}_total" if type_name == "counter" else f"cache_{key}"
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {type_name}"]
+        lines += [f'{name}{{cache="{_escape(cache_name)}"}} {_format_number(values[key])}'
+                  for cache_name, values in stats.items()]
+    return lines
+
+
+def render() -> bytes:
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    lines += _render_caches()
+    return ("\n".join(lines) + "\n").encode()
+
+
+# --- Middleware -----------------------------------------------------------------
+
+def _route_label(scope) -> str:
+    # The route template, not the raw path, so /items/1 and /items/2 share a series.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def server_timing(timings: RequestTimings, now: float) -> str:
+    return ", ".join([
+        f"app;dur={(now - timings.started) * 1000:.1f}",
+        f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.db_queries} queries"',
+        f"bcrypt;dur={timings.bcrypt_seconds * 1000:.1f}",
+    ])
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status, in-flight count and per-request database time for
+    every HTTP request, and optionally reports them in a Server-Timing header.
+    """
+
+    def __init__(self, app, server_timing_enabled: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.server_timing_enabled = server_timing_enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings(started=time.perf_counter())
+        token = _current.set(timings)
+        status_code = 500
+
+        async def send_with_metrics(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing_enabled:
+                    header = server_timing(timings, time.perf_counter()).encode()
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", header)]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            IN_FLIGHT.dec()
+            _current.reset(token)
+            method, route = scope["method"], _route_label(scope)
+            REQUESTS.inc(method, route, str(status_code))
+            REQUEST_DURATION.observe(time.perf_counter() - timings.started, method, route)
+            REQUEST_DB_QUERIES.observe(timings.db_queries, method, route)
+            REQUEST_DB_DURATION.observe(timings.db_seconds, method, route)
@@ -0,0 +1,43 @@
+"""Indexes for the catalog listing and the order queries
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:01
+
+Items by category, by price and by category and price, and orders by
+status, by customer and by date, each ending in the keyset pagination
+column. A user's cart and an order's line items are already served by the
+leading columns of the baseline's unique constraints. Databases created by
+create_all after these indexes were added to models.py have some of them
+already, hence if_not_exists.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_items_category_id", "items", ["category", "id"], if_not_exists=True)
+    op.create_index("ix_items_price_id", "items", ["price", "id"], if_not_exists=True)
+    op.create_index("ix_items_category_price_id", "items", ["category", "price", "id"], if_not_exists=True)
+    op.create_index("ix_orders_order_date", "orders", ["order_date"], if_not_exists=True)
+    op.create_index("ix_orders_status_order_date", "orders", ["status", "order_date"], if_not_exists=True)
+    op.create_index("ix_orders_customer_id_order_date", "orders", ["customer_id", "order_date"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_orders_customer_id_order_date", table_name="orders")
+    op.drop_index("ix_orders_status_order_date", table_name="orders")
+    op.drop_index("ix_orders_order_date", table_name="orders")
+    op.drop_index("ix_items_category_price_id", table_name="items")
+    op.drop_index("ix_items_price_id", table_name="items")
+    op.drop_index("ix_items_category_id", table_name="items")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint, DateTime, Numeric
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint, DateTime, Date, Numeric, Index, JSON, LargeBinary
 from datetime import datetime
 from sqlalchemy.orm import relationship
 from database import Base
@@ -20,6 +20,12 @@ class User(Base):
 
 class Item(Base):
     __tablename__ = 'items'
+    __table_args__ = (
+        # Composite indexes backing keyset pagination of the catalog listing
+        Index('ix_items_category_id', 'category', 'id'),
+        Index('ix_items_price_id', 'price', 'id'),
+        Index('ix_items_category_price_id', 'category', 'price', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     image_name = Column(String)
@@ -52,6 +58,13 @@ class Cart(Base):
 
 class Order(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Newest-first keyset pagination of the admin order listing, unfiltered
+        # and filtered by status or customer (SQLite appends the id to each).
+        Index('ix_orders_order_date', 'order_date'),
+        Index('ix_orders_status_order_date', 'status', 'order_date'),
+        Index('ix_orders_customer_id_order_date', 'customer_id', 'order_date'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_name = Column(String, index=True)
@@ -83,4 +96,77 @@ class OrderItem(Base):
 
     # Relationships
     order = relationship("Order", back_populates="items")
-    item = relationship("Item", back_populates="order_line_items")
\ No newline at end of file
+    item = relationship("Item", back_populates="order_line_items")
+
+
+class StoreStats(Base):
+    """Single-row running totals for the admin dashboard, updated alongside each write."""
+    __tablename__ = 'store_stats'
+
+    id = Column(Integer, primary_key=True)
+    total_users = Column(Integer, nullable=False, default=0)
+    total_items = Column(Integer, nullable=False, default=0)
+    total_orders = Column(Integer, nullable=False, default=0)
+    total_revenue = Column(Numeric(12, 2), nullable=False, default=0)  # Completed orders only
+
+
+class DailyStats(Base):
+    """Orders placed and completed-order revenue per calendar day (by order date)."""
+    __tablename__ = 'daily_stats'
+
+    day = Column(Date, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(12, 2), nullable=False, default=0)
+
+
+class Job(Base):
+    """Background work queued by a request and run by the jobs.py workers after it commits."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Workers look for due jobs by status and run_at.
+        Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    # Enqueueing a second job with the same key is a no-op. NULL keys never collide.
+    idempotency_key = Column(String, unique=True)
+    status = Column(String, nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False)
+    # A running job whose lease has expired is assumed abandoned and runs again.
+    locked_until = Column(DateTime)
+    last_error = Column(String)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+
+class IdempotencyKey(Base):
+    """The outcome of a request sent with an Idempotency-Key header, replayed to retries of it."""
+    __tablename__ = 'idempotency_keys'
+
+    # Keys are chosen by clients, so they are only unique per user.
+    user_id = Column(Integer, primary_key=True)
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)  # SHA-256 of the endpoint and request body
+    status = Column(String, nullable=False)  # in_progress, completed
+    status_code = Column(Integer)
+    body = Column(LargeBinary)
+    # An in_progress claim not finished by then (its request died) can be taken over.
+    locked_until = Column(DateTime)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class CacheInvalidation(Base):
+    """A change to cached data, written by the process that made it and replayed by every other one."""
+    __tablename__ = 'cache_invalidations'
+    # Ids are never reused, even after old rows are purged: they double as the catalog ETag version.
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    origin = Column(String, nullable=False)  # the publishing process, which has already applied it
+    kind = Column(String, nullable=False)  # items, listings, catalog, principals
+    keys = Column(JSON, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,268 @@
+import contextvars
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # pyinstrument is optional; without it only the slow-query log works.
+    Profiler = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests profiled (0 = off). Admins can change it at runtime
+# through PUT /admin/profiling; the change applies to this process only.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))  # seconds between samples
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))  # newest profiles kept on disk
+
+# Statements slower than this are logged (0 = off).
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+# Distinct slow statements tracked (with their plan) before new ones are only logged.
+SLOW_QUERY_MAX_STATEMENTS = int(os.getenv("SLOW_QUERY_MAX_STATEMENTS", "100"))
+
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+_request_scope = contextvars.ContextVar("request_scope", default=None)
+
+
+def current_route() -> str | None:
+    """The route template of the request being handled, e.g. "/items/{item_id}"."""
+    scope = _request_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path")
+
+
+# --- Sampling profiler ----------------------------------------------------------
+
+class ProfileStore:
+    """Keeps the newest PROFILE_KEEP profiles as speedscope JSON files in `directory`."""
+
+    def __init__(self, directory: str, keep: int):
+        self.directory = directory
+        self.sample_rate = PROFILE_SAMPLE_RATE
+        self._profiles = deque()  # newest last
+        self._keep = keep
+        self._lock = threading.Lock()
+
+    def should_profile(self) -> bool:
+        return Profiler is not None and self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def save(self, session, method: str, route: str, status_code: int) -> dict:
+        started = datetime.fromtimestamp(session.start_time, timezone.utc)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        name = f"{started:%Y%m%dT%H%M%S%f}-{method}-{slug}.speedscope.json"
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "w", encoding="utf-8") as out:
+            out.write(SpeedscopeRenderer().render(session))
+        record = {
+            "name": name,
+            "method": method,
+            "route": route,
+            "status": status_code,
+            "duration_ms": round(session.duration * 1000, 1),
+            "started": started.isoformat(),
+        }
+        with self._lock:
+            self._profiles.append(record)
+            expired = [self._profiles.popleft() for _ in range(len(self._profiles) - self._keep)]
+        for old in expired:
+            try:
+                os.remove(os.path.join(self.directory, old["name"]))
+            except FileNotFoundError:
+                pass
+        return record
+
+    def list(self) -> list[dict]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def path(self, name: str) -> str | None:
+        """The file of a stored profile, or None; only names this store wrote are served."""
+        with self._lock:
+            if not any(record["name"] == name for record in self._profiles):
+                return None
+        return os.path.join(self.directory, name)
+
+
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_KEEP)
+
+
+class ProfilingMiddleware:
+    """
+    Makes the current request visible to the slow-query log and runs a
+    statistical profiler over a sampled fraction of requests. Profiles cover
+    the request's own task only (time spent awaiting shows up as such), so
+    concurrent requests don't pollute each other.
+    """
+
+    def __init__(self, app, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_scope.set(scope)
+        try:
+            if not self.store.should_profile():
+                await self.app(scope, receive, send)
+                return
+            status_code = 500
+
+            async def send_with_status(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                await send(message)
+
+            profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+            profiler.start()
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                session = profiler.stop()
+                await run_in_threadpool(
+                    self.store.save, session, scope["method"], current_route() or "unmatched", status_code,
+                )
+        finally:
+            _request_scope.reset(token)
+
+
+# --- Slow-query log -------------------------------------------------------------
+
+def parameter_shape(parameters, executemany: bool) -> str:
+    """Describes bound parameters by type only, so the log never holds user data."""
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} x {parameter_shape(rows[0], False)}" if rows else "0 rows"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if parameters:
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return "()"
+
+
+class SlowQueryLog:
+    """
+    Recent statements slower than the threshold, plus per-statement totals.
+    The first time a statement turns out slow its query plan is captured on
+    the same connection (EXPLAIN QUERY PLAN on SQLite, EXPLAIN elsewhere;
+    neither runs the statement).
+    """
+
+    def __init__(self, threshold_ms: float, size: int, max_statements: int):
+        self.threshold_ms = threshold_ms
+        self._recent = deque(maxlen=size)
+        self._statements = {}  # SQL text -> totals and plan
+        self._max_statements = max_statements
+        self._lock = threading.Lock()
+
+    def record(self, conn, cursor, statement: str, parameters, executemany: bool, duration_ms: float):
+        route = current_route()
+        entry = {
+            "statement": statement,
+            "parameters": parameter_shape(parameters, executemany),
+            "duration_ms": round(duration_ms, 2),
+            "route": route,
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        logger.warning("Slow query (%.1f ms) on %s: %s %s", duration_ms, route or "-", statement, entry["parameters"])
+        with self._lock:
+            self._recent.append(entry)
+            totals = self._statements.get(statement)
+            new = totals is None and len(self._statements) < self._max_statements
+            if new:
+                totals = self._statements[statement] = {
+                    "statement": statement, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": set(), "plan": None,
+                }
+            if totals is not None:
+                totals["count"] += 1
+                totals["total_ms"] += duration_ms
+                totals["max_ms"] = max(totals["max_ms"], duration_ms)
+                if route:
+                    totals["routes"].add(route)
+        if new:
+            totals["plan"] = explain(conn, statement, parameters[0] if executemany else parameters)
+
+    def report(self) -> dict:
+        with self._lock:
+            statements = sorted(self._statements.values(), key=lambda totals: -totals["total_ms"])
+            return {
+                "threshold_ms": self.threshold_ms,
+                "statements": [
+                    {**totals, "total_ms": round(totals["total_ms"], 2), "max_ms": round(totals["max_ms"], 2),
+                     "routes": sorted(totals["routes"])}
+                    for totals in statements
+                ],
+                "recent": list(reversed(self._recent)),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self._statements.clear()
+
+
+def explain(conn, statement: str, parameters) -> list[str] | str:
+    """The query plan of `statement` as text lines, or the reason there is none."""
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return "not explainable"
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        # A raw DBAPI cursor: no SQLAlchemy events, and the parameters are
+        # already in the driver's format.
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters or ())
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    return [" | ".join(str(value) for value in row) for row in rows]
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_LOG_SIZE, SLOW_QUERY_MAX_STATEMENTS)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info["slow_query_started"].pop()) * 1000
+    if duration_ms >= slow_query_log.threshold_ms:
+        slow_query_log.record(conn, cursor, statement, parameters, executemany, duration_ms)
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("slow_query_started"):
+        connection.info["slow_query_started"].pop()
+
+
+def instrument_engine(engine) -> None:
+    """Logs slow statements run on a sync Engine (pass async_engine.sync_engine for async ones)."""
+    if SLOW_QUERY_MS <= 0 or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,185 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+
+load_dotenv()
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# "memory" keeps buckets per process; "sqlite" shares them between the worker
+# processes of one host through RATE_LIMIT_SQLITE_PATH.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "ratelimit.db")
+# Buckets kept in memory; the least recently used are dropped beyond this.
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True, slots=True)
+class Limit:
+    """A token bucket holding up to `burst` requests, refilled at `rate` per second."""
+    name: str
+    rate: float
+    burst: int
+
+    @classmethod
+    def parse(cls, name: str, spec: str) -> "Limit":
+        """Reads "<count>/<second|minute|hour|day>", e.g. "10/minute": bursts of 10, refilled evenly over a minute."""
+        count, _, period = spec.partition("/")
+        if period not in PERIODS or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid rate limit {spec!r} for {name}; expected e.g. '10/minute'")
+        return cls(name, int(count) / PERIODS[period], int(count))
+
+
+LOGIN_PER_IP = Limit.parse("login_ip", os.getenv("RATE_LIMIT_LOGIN_IP", "20/minute"))
+LOGIN_PER_ACCOUNT = Limit.parse("login_account", os.getenv("RATE_LIMIT_LOGIN_ACCOUNT", "5/minute"))
+REGISTER_PER_IP = Limit.parse("register_ip", os.getenv("RATE_LIMIT_REGISTER_IP", "5/minute"))
+SEARCH_PER_IP = Limit.parse("search_ip", os.getenv("RATE_LIMIT_SEARCH_IP", "120/minute"))
+
+
+def _refill(tokens: float, updated: float, now: float, limit: Limit) -> float:
+    return min(float(limit.burst), tokens + (now - updated) * limit.rate)
+
+
+def _take(tokens: float, limit: Limit) -> tuple[float, float]:
+    """(tokens left, seconds to wait); the wait is 0 when the request is allowed."""
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / limit.rate
+
+
+class MemoryStore:
+    """Token buckets of this process in an LRU dict of at most `max_keys` entries."""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # (limit name, key) -> (tokens, updated)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def take(self, limit: Limit, key: str) -> float:
+        """Takes a token; returns 0 if allowed, otherwise the seconds to wait."""
+        now = time.monotonic()
+        bucket_key = (limit.name, key)
+        with self._lock:
+            bucket = self._buckets.get(bucket_key)
+            tokens = float(limit.burst) if bucket is None else _refill(*bucket, now, limit)
+            tokens, retry_after = _take(tokens, limit)
+            self._buckets[bucket_key] = (tokens, now)
+            self._buckets.move_to_end(bucket_key)
+            # A dropped bucket starts full again, which only errs towards allowing.
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        return retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteStore:
+    """
+    Token buckets in a SQLite file, shared by every worker process on the host.
+    Each take is one short write transaction; buckets idle long enough to be
+    full again are deleted now and then.
+    """
+
+    blocking = True
+    CLEAN_UP_EVERY = 10000  # takes
+
+    def __init__(self, path: str = RATE_LIMIT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT NOT NULL, key TEXT NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL, "
+                "refilled_at REAL NOT NULL, PRIMARY KEY (name, key)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_buckets_refilled_at ON buckets (refilled_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, limit: Limit, key: str) -> float:
+        # Wall-clock time, since the buckets are shared between processes.
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ? AND key = ?", (limit.name, key)).fetchone()
+            tokens = float(limit.burst) if row is None else _refill(row[0], row[1], now, limit)
+            tokens, retry_after = _take(tokens, limit)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, key, tokens, updated, refilled_at) VALUES (?, ?, ?, ?, ?)",
+                (limit.name, key, tokens, now, now + (limit.burst - tokens) / limit.rate),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._takes += 1
+        if self._takes % self.CLEAN_UP_EVERY == 0:
+            conn.execute("DELETE FROM buckets WHERE refilled_at < ?", (now,))
+        return retry_after
+
+    def clear(self):
+        self._connect().execute("DELETE FROM buckets")
+
+
+def create_store():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteStore(RATE_LIMIT_SQLITE_PATH)
+    if RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(f"RATE_LIMIT_BACKEND must be 'memory' or 'sqlite', not {RATE_LIMIT_BACKEND!r}")
+    return MemoryStore(RATE_LIMIT_MAX_KEYS)
+
+
+store = create_store()
+
+
+def client_ip(request: Request) -> str:
+    # Behind a reverse proxy, run uvicorn with --proxy-headers and
+    # --forwarded-allow-ips so this is the client's address, not the proxy's.
+    return request.client.host if request.client else "unknown"
+
+
+async def check(limit: Limit, key: str) -> None:
+    """Spends one request of `key`'s allowance under `limit`, or raises 429 with Retry-After."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    retry_after = await run_in_threadpool(store.take, limit, key) if store.blocking else store.take(limit, key)
+    if retry_after:
+        metrics.RATE_LIMIT_REJECTIONS.inc(limit.name)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+def per_ip(limit: Limit):
+    """A dependency that applies `limit` to the caller's IP address."""
+    async def dependency(request: Request):
+        await check(limit, client_ip(request))
+    return dependency
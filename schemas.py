@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr, field_validator
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field, computed_field, field_validator
+from typing import Optional, List, Dict, Literal
 from datetime import datetime
+import imaging
 
 # --- Token Schemas for Authentication ---
 class Token(BaseModel):
@@ -64,9 +65,20 @@ class Item(ItemBase):
     id: int
     image_name: str  # Optional field for image name
 
+    @computed_field
+    @property
+    def image_variants(self) -> Dict[str, Dict[str, str]]:
+        """Resized copies of the image by size ("thumb", "medium") and format ("webp", "jpeg")."""
+        return imaging.variant_urls(self.image_name)
+
     class Config:
         from_attributes = True  # Allows Pydantic to work with SQLAlchemy models
 
+class ItemPage(BaseModel):
+    """One page of the catalog listing."""
+    items: List[Item]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` to fetch the next page
+
 
 class CartBase(BaseModel):
     item_id: int
@@ -90,6 +102,26 @@ class Cart(CartBase):
     class Config:
         from_attributes = True  # Allows Pydantic to work with SQLAlchemy models
 
+class CartLine(Cart):
+    """A cart line together with the item's current details."""
+    name: str
+    price: float  # Current price; the order records the price at checkout
+    available: int  # Units in stock right now
+    image_name: Optional[str] = None
+
+class CartOperation(BaseModel):
+    """Adds `quantity` units of an item, or sets its quantity ("set"; 0 removes the line)."""
+    item_id: int
+    quantity: int = Field(ge=0)
+    mode: Literal["add", "set"] = "add"
+
+class CartQuantity(BaseModel):
+    quantity: int = Field(ge=0)  # 0 removes the item from the cart
+
+class CartBatch(BaseModel):
+    """Cart changes applied together in one transaction, in order."""
+    operations: List[CartOperation] = Field(min_length=1, max_length=100)
+
 
 
 class OrderBase(BaseModel):
@@ -131,7 +163,41 @@ class OrderItem(OrderItemBase):
     class Config:
         from_attributes = True  # Allows Pydantic to work with SQLAlchemy models
 
+class OrderDetail(Order):
+    """Schema for an order together with its line items."""
+    items: List[OrderItem] = []
+
+class OrderPage(BaseModel):
+    """One page of the admin order listing."""
+    orders: List[OrderDetail]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` to fetch the next page
+
+class UserPage(BaseModel):
+    """One page of the admin user listing."""
+    users: List[S_User]
+    next_cursor: Optional[str] = None
+
+class ItemImport(ItemCreate):
+    """One row of a bulk catalog import. Rows with an id update that item (or create it with that id)."""
+    id: Optional[int] = Field(None, gt=0)
+    image_name: Optional[str] = None  # A file name in images/ (no directory); required for new items
+
+class ImportRowError(BaseModel):
+    row: int  # Line number in the uploaded file
+    error: str
+
+class ImportReport(BaseModel):
+    """Outcome of a bulk catalog import."""
+    rows: int
+    created: int
+    updated: int
+    failed: int
+    errors: List[ImportRowError] = []  # The first IMPORT_MAX_ERRORS failures
+
+
 
+class ProfilingSettings(BaseModel):
+    sample_rate: float = Field(ge=0, le=1)  # Fraction of requests profiled; 0 turns profiling off
 
 class AdminOrderStatus(BaseModel):
     id: int
@@ -0,0 +1,146 @@
+import logging
+import re
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# Column weights for bm25(): a hit in the name outranks one in the category,
+# which outranks one in the description.
+BM25_WEIGHTS = "10.0, 1.0, 2.0"
+
+_FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        name, description, category,
+        content='items', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END
+    """,
+    # Only fire when an indexed column changes, so stock updates don't touch the index.
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF name, description, category ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO items_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END
+    """,
+]
+
+_fts_available = False
+
+
+def install_fts(engine: Engine) -> bool:
+    """
+    Creates the items_fts index and its sync triggers if they don't exist yet.
+    Returns False (and search falls back to LIKE) on non-SQLite databases or
+    SQLite builds compiled without FTS5.
+    """
+    global _fts_available
+    if engine.dialect.name != "sqlite":
+        _fts_available = False
+        return False
+    try:
+        with engine.begin() as conn:
+            existed = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'")
+            ).first() is not None
+            for statement in _FTS_SCHEMA:
+                conn.execute(text(statement))
+            if not existed:
+                # Index the rows that were in `items` before the triggers existed.
+                conn.execute(text("INSERT INTO items_fts(items_fts) VALUES ('rebuild')"))
+    except OperationalError as e:
+        logger.warning("Full-text search unavailable, falling back to LIKE: %s", e)
+        _fts_available = False
+        return False
+    _fts_available = True
+    return True
+
+
+def detect_fts(engine: Engine) -> bool:
+    """Checks for an items_fts index created by another process (see init_db), without creating it."""
+    global _fts_available
+    if engine.dialect.name != "sqlite":
+        _fts_available = False
+        return False
+    with engine.connect() as conn:
+        _fts_available = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'")
+        ).first() is not None
+    return _fts_available
+
+
+def fts_available() -> bool:
+    return _fts_available
+
+
+def build_match_query(q: str) -> str | None:
+    """
+    Turns free text into an FTS5 MATCH expression where every term must match
+    and the last term is also matched as a prefix (for autocomplete).
+    Returns None if `q` has no searchable terms.
+    """
+    terms = re.findall(r"\w+", q, re.UNICODE)
+    if not terms:
+        return None
+    # Quoting each term keeps FTS5 operators (AND, NEAR, column filters) in the
+    # user's input from being interpreted.
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def fts_search(db: Session, q: str, limit: int, offset: int = 0) -> list[models.Item]:
+    """Full-text search over name, description and category, best matches first."""
+    match = build_match_query(q)
+    if match is None:
+        return []
+    statement = text(
+        f"""
+        SELECT items.* FROM items_fts
+        JOIN items ON items.id = items_fts.rowid
+        WHERE items_fts MATCH :match
+        ORDER BY bm25(items_fts, {BM25_WEIGHTS}), items.id
+        LIMIT :limit OFFSET :offset
+        """
+    )
+    query = select(models.Item).from_statement(statement)
+    return list(db.scalars(query, {"match": match, "limit": limit, "offset": offset}))
+
+
+def like_search(db: Session, q: str, limit: int, offset: int = 0) -> list[models.Item]:
+    """Case-insensitive substring match on the item name (full table scan)."""
+    return (
+        db.query(models.Item)
+        .filter(models.Item.name.ilike(f"%{q}%"))
+        .order_by(models.Item.id)
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+
+
+def search_items(db: Session, q: str, limit: int, offset: int = 0) -> list[models.Item]:
+    if _fts_available:
+        return fts_search(db, q, limit, offset)
+    return like_search(db, q, limit, offset)
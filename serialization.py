@@ -0,0 +1,88 @@
+import datetime
+import json
+import os
+from decimal import Decimal
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is the fallback.
+    orjson = None
+
+load_dotenv()
+
+# "orjson" (default when installed) or "json": the encoder for responses that
+# aren't described by a response model, e.g. the admin stats.
+JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson" if orjson is not None else "json").lower()
+if JSON_ENCODER not in ("orjson", "json"):
+    raise ValueError(f"JSON_ENCODER must be 'orjson' or 'json', not {JSON_ENCODER!r}")
+if JSON_ENCODER == "orjson" and orjson is None:
+    raise ValueError("JSON_ENCODER=orjson requires the orjson package")
+
+
+def json_default(value):
+    """Encodes the types orjson and json don't know, the way FastAPI's jsonable_encoder does."""
+    if isinstance(value, Decimal):
+        # Whole amounts stay integers; anything with a fractional part is a float.
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if JSON_ENCODER == "orjson":
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=json_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """The app's default response class: renders with `dumps`."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def type_adapter(schema) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def _loaded_state(value):
+    """
+    Swaps ORM instances for their instance dict, recursing through lists and dicts.
+    Pydantic validates a dict several times faster than it reads the same values
+    through SQLAlchemy's instrumented attributes.
+    """
+    if isinstance(value, list):
+        return [_loaded_state(entry) for entry in value]
+    if isinstance(value, dict):
+        return {key: _loaded_state(entry) for key, entry in value.items()}
+    state = getattr(value, "__dict__", None)
+    if state is not None and "_sa_instance_state" in state:
+        # Loaded relationships (e.g. an order's items) are converted too.
+        return {key: _loaded_state(entry) if isinstance(entry, list) else entry for key, entry in state.items()}
+    return value
+
+
+def dump_json(schema, content) -> bytes:
+    """
+    Validates `content` (ORM objects, or lists/dicts of them) as `schema` and
+    serializes it with pydantic's encoder: the same bytes FastAPI would produce
+    for response_model=schema, at a fraction of the cost. Falls back to regular
+    attribute access when an attribute the schema needs isn't loaded.
+    """
+    adapter = type_adapter(schema)
+    try:
+        value = adapter.validate_python(_loaded_state(content))
+    except ValidationError:
+        value = adapter.validate_python(content)
+    return adapter.dump_json(value)
@@ -0,0 +1,63 @@
+import argparse
+import logging
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    # The CPUs this process may run on, which in a container can be fewer than the host's.
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def default_workers() -> int:
+    """WEB_CONCURRENCY if set, otherwise one worker per available CPU."""
+    return int(os.getenv("WEB_CONCURRENCY") or available_cpus())
+
+
+def main():
+    """
+    The production entry point: creates the schema once, then starts uvicorn
+    with several worker processes. Each worker has its own caches, kept in
+    step through invalidation.py, and its own job worker threads.
+    """
+    parser = argparse.ArgumentParser(description="Run the API with one worker process per CPU.")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="default: WEB_CONCURRENCY or the CPU count")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    parser.add_argument("--no-access-log", action="store_true")
+    options = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    # Once here rather than in every worker: concurrent CREATE TABLEs race each other.
+    from init_db import init_db
+    init_db()
+    os.environ["DB_AUTO_INIT"] = "false"
+    if options.workers > 1:
+        # Per-process buckets would let a client through once per worker.
+        os.environ.setdefault("RATE_LIMIT_BACKEND", "sqlite")
+    logger.info("Starting %d worker process(es) on %s:%d", options.workers, options.host, options.port)
+
+    # Behind a reverse proxy, set FORWARDED_ALLOW_IPS to its address so client
+    # addresses (used by the rate limits) come from X-Forwarded-For.
+    uvicorn.run(
+        "main:app",
+        host=options.host,
+        port=options.port,
+        workers=options.workers,
+        log_level=options.log_level,
+        access_log=not options.no_access_log,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
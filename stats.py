@@ -0,0 +1,172 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Literal
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+load_dotenv()
+
+# Serve the dashboard from the store_stats / daily_stats tables (O(1)) instead of
+# aggregating the base tables on every request. The tables are kept up to date
+# either way, so this can be switched at any time.
+STATS_MATERIALIZED = os.getenv("STATS_MATERIALIZED", "true").lower() in ("1", "true", "yes")
+
+STATS_ROW_ID = 1
+Period = Literal["daily", "weekly"]
+Stats = models.StoreStats
+Daily = models.DailyStats
+
+
+# --- Incremental maintenance -------------------------------------------------
+# Each function runs inside the caller's transaction (via session.run_sync for
+# async sessions), so the counters commit or roll back with the write they describe.
+
+def _bump(session: Session, **deltas):
+    values = {name: getattr(Stats, name) + delta for name, delta in deltas.items()}
+    session.execute(update(Stats).where(Stats.id == STATS_ROW_ID).values(**values))
+
+
+def _bump_day(session: Session, day: date, orders: int = 0, revenue=0):
+    insert = dialect_insert(session.get_bind())
+    statement = insert(Daily).values(day=day, orders=orders, revenue=revenue)
+    session.execute(statement.on_conflict_do_update(
+        index_elements=[Daily.day],
+        set_={
+            "orders": Daily.orders + statement.excluded.orders,
+            "revenue": Daily.revenue + statement.excluded.revenue,
+        },
+    ))
+
+
+def record_user_created(session: Session):
+    _bump(session, total_users=1)
+
+
+def record_item_created(session: Session, count: int = 1):
+    _bump(session, total_items=count)
+
+
+def record_order_placed(session: Session, order_date: datetime):
+    _bump(session, total_orders=1)
+    _bump_day(session, order_date.date(), orders=1)
+
+
+def record_status_change(session: Session, order_date: datetime, amount, old_status: str, new_status: str):
+    """Moves the order's amount into or out of revenue when it becomes or stops being completed."""
+    if (old_status == "completed") == (new_status == "completed"):
+        return
+    delta = amount if new_status == "completed" else -amount
+    _bump(session, total_revenue=delta)
+    _bump_day(session, order_date.date(), revenue=delta)
+
+
+# --- Rebuilding from the base tables -----------------------------------------
+
+def live_totals_query():
+    """All four dashboard totals computed from the base tables in one statement."""
+    return select(
+        select(func.count()).select_from(models.User).scalar_subquery().label("total_users"),
+        select(func.count()).select_from(models.Item).scalar_subquery().label("total_items"),
+        select(func.count()).select_from(models.Order).scalar_subquery().label("total_orders"),
+        select(func.coalesce(func.sum(models.Order.total_amount), 0))
+        .where(models.Order.status == "completed")
+        .scalar_subquery().label("total_revenue"),
+    )
+
+
+def live_daily_query(since: date):
+    order_day = func.date(models.Order.order_date)
+    completed = models.Order.status == "completed"
+    return (
+        select(
+            order_day.label("day"),
+            func.count().label("orders"),
+            func.coalesce(func.sum(models.Order.total_amount).filter(completed), 0).label("revenue"),
+        )
+        .where(models.Order.order_date >= datetime.combine(since, datetime.min.time()))
+        .group_by(order_day)
+    )
+
+
+def rebuild(session: Session):
+    """Recomputes store_stats and daily_stats from scratch. Caller commits."""
+    totals = session.execute(live_totals_query()).one()._asdict()
+    session.execute(delete(Stats))
+    session.add(Stats(id=STATS_ROW_ID, **totals))
+    session.execute(delete(Daily))
+    rows = session.execute(live_daily_query(date.min)).all()
+    session.add_all(Daily(day=_as_date(row.day), orders=row.orders, revenue=row.revenue) for row in rows)
+
+
+def ensure_initialized(engine: Engine):
+    """Builds the stats tables on first start (e.g. for a database that predates them)."""
+    with Session(engine) as session:
+        if session.get(Stats, STATS_ROW_ID) is None:
+            rebuild(session)
+            session.commit()
+
+
+# --- Reading -----------------------------------------------------------------
+
+def read_totals(session: Session) -> dict:
+    if STATS_MATERIALIZED:
+        row = session.get(Stats, STATS_ROW_ID)
+        return {
+            "total_users": row.total_users,
+            "total_items": row.total_items,
+            "total_orders": row.total_orders,
+            "total_revenue": row.total_revenue,
+        }
+    return session.execute(live_totals_query()).one()._asdict()
+
+
+def read_series(session: Session, period: Period, days: int) -> list[dict]:
+    """
+    Order count and completed revenue per day or per week (starting Monday)
+    over the last `days` days, oldest first, with empty periods included.
+    """
+    today = datetime.now(timezone.utc).date()
+    since = today - timedelta(days=days - 1)
+    if STATS_MATERIALIZED:
+        rows = session.execute(select(Daily.day, Daily.orders, Daily.revenue).where(Daily.day >= since)).all()
+    else:
+        rows = session.execute(live_daily_query(since)).all()
+
+    def bucket(day: date) -> date:
+        return day - timedelta(days=day.weekday()) if period == "weekly" else day
+
+    series = {}
+    day = since
+    while day <= today:
+        series.setdefault(bucket(day), {"period_start": bucket(day), "orders": 0, "revenue": Decimal("0.00")})
+        day += timedelta(days=1)
+    for row in rows:
+        entry = series.get(bucket(_as_date(row.day)))
+        if entry is not None:
+            entry["orders"] += row.orders
+            entry["revenue"] += Decimal(str(row.revenue))
+    return list(series.values())
+
+
+def _as_date(value) -> date:
+    # SQLite's date() returns text.
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+if __name__ == "__main__":
+    # Resynchronise the counters after writes that bypassed the API (bulk SQL, restores).
+    from database import engine
+    from init_db import init_db
+
+    init_db(engine)
+    with Session(engine) as session:
+        rebuild(session)
+        session.commit()
+        print(read_totals(session))
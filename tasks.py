@@ -0,0 +1,89 @@
+import logging
+import os
+import smtplib
+from concurrent.futures.process import BrokenProcessPool
+from email.message import EmailMessage
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+
+import imaging
+import models
+from jobs import handler
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Without SMTP_HOST, emails are only logged.
+SMTP_HOST = os.getenv("SMTP_HOST") or None
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER") or None
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD") or None
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+MAIL_FROM = os.getenv("MAIL_FROM", "shop@localhost")
+
+ORDER_PLACED = "order.placed"
+ORDER_STATUS_CHANGED = "order.status_changed"
+IMAGE_VARIANTS = "item.image_variants"
+
+
+def send_email(to: str, subject: str, body: str):
+    message = EmailMessage()
+    message["From"] = MAIL_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    if SMTP_HOST is None:
+        logger.info("Email to %s (SMTP_HOST not set, not sent): %s", to, subject)
+        return
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT) as smtp:
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+        smtp.send_message(message)
+
+
+def _load_order(session: Session, order_id: int) -> models.Order | None:
+    return session.scalar(
+        select(models.Order)
+        .options(selectinload(models.Order.user), selectinload(models.Order.items).selectinload(models.OrderItem.item))
+        .where(models.Order.id == order_id)
+    )
+
+
+@handler(ORDER_PLACED)
+def send_order_confirmation(session: Session, payload: dict):
+    order = _load_order(session, payload["order_id"])
+    if order is None:
+        return
+    lines = [f"Thank you for your order, {order.customer_name}.", "", f"Order #{order.id}:"]
+    lines += [f"  {line.quantity} x {line.item.name} at {line.price}" for line in order.items]
+    lines += ["", f"Total: {order.total_amount}", f"Delivery to: {order.customer_address}"]
+    send_email(order.user.email, f"Order #{order.id} confirmed", "\n".join(lines))
+
+
+@handler(ORDER_STATUS_CHANGED)
+def send_status_update(session: Session, payload: dict):
+    order = session.get(models.Order, payload["order_id"], options=[selectinload(models.Order.user)])
+    if order is None:
+        return
+    send_email(
+        order.user.email,
+        f"Order #{order.id} is {payload['status']}",
+        f"Hello {order.customer_name},\n\nThe status of your order #{order.id} is now: {payload['status']}.",
+    )
+
+
+@handler(IMAGE_VARIANTS)
+def make_image_variants(session: Session, payload: dict):
+    # The resizing itself runs in the image process pool, off this worker's GIL.
+    try:
+        imaging.get_pool().submit(imaging.generate_variants, payload["image_name"], imaging.IMAGES_DIR).result()
+    except BrokenProcessPool:
+        # A crashed child breaks the pool for good; start a new one for the retry.
+        imaging.shutdown_pool()
+        raise
@@ -0,0 +1,29 @@
+"""
+The tests run the checks in benchmarks/ against the app imported once, with a
+throwaway SQLite database and working directory (see common.import_app).
+"""
+import os
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+if BENCHMARKS not in sys.path:
+    sys.path.insert(0, BENCHMARKS)
+
+from common import temp_sqlite_url  # noqa: E402  (also puts the app on sys.path)
+
+# Never the database from .env: the checks seed their own data. An absolute
+# path, since common.import_app changes the working directory.
+os.environ["DATABASE_URL"] = temp_sqlite_url("test.db")
+
+import query_budget  # noqa: E402  (also the app settings every check runs with)
+
+
+@pytest.fixture(scope="session")
+def seeded_app():
+    """
+    main and a statement counter, with the query_budget catalog seeded before
+    any check adds items of its own (its scenario expects items 1 to 100).
+    """
+    return query_budget.setup()
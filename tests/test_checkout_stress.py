@@ -0,0 +1,23 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import checkout_stress
+
+
+@pytest.fixture(scope="module")
+def loop():
+    # One loop for every round: the app's pool and session semaphore stay bound
+    # to the loop they first waited in, as they would in a server process.
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.mark.parametrize("shoppers, stock, quantity", [(120, 30, 1), (60, 25, 2)])
+def test_concurrent_checkouts_never_oversell(seeded_app, loop, shoppers, stock, quantity):
+    options = SimpleNamespace(shoppers=shoppers, stock=stock, quantity=quantity)
+    result = loop.run_until_complete(checkout_stress.main_async(options))
+    assert not result["oversold"], result
+    assert result["consistent"], result
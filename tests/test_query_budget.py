@@ -0,0 +1,24 @@
+import pytest
+
+import query_budget
+from query_budget import BUDGETS, LARGE, SMALL
+
+
+@pytest.fixture(scope="module")
+def counts(seeded_app):
+    main, counter = seeded_app
+    return query_budget.run_scenario(main, counter, SMALL), query_budget.run_scenario(main, counter, LARGE)
+
+
+@pytest.mark.parametrize("endpoint", BUDGETS)
+def test_endpoint_within_budget(counts, endpoint):
+    small, large = counts
+    assert query_budget.verdict(endpoint, small, large) == "ok", (
+        f"{endpoint}: budget {BUDGETS[endpoint]}, ran {small.get(endpoint)} statements with "
+        f"{SMALL} rows and {large.get(endpoint)} with {LARGE}"
+    )
+
+
+def test_every_endpoint_has_a_budget(counts):
+    small, _ = counts
+    assert set(small) <= set(BUDGETS)
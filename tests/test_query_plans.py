@@ -0,0 +1,25 @@
+import pytest
+
+import query_plans
+
+
+@pytest.fixture(scope="module")
+def plans(seeded_app):
+    main, _ = seeded_app
+    import database
+
+    query_plans.seed(database.engine, users=500, items=5000, orders=5000)
+    return query_plans.check_plans(main)
+
+
+def test_statements_were_recorded(plans):
+    endpoints = {endpoint for endpoint, *_ in plans}
+    assert "GET /items" in endpoints and "GET /admin/orders" in endpoints
+
+
+def test_no_full_scans_or_sorts_before_limit(plans):
+    failures = [
+        f"{query_plans.describe(found)} [{endpoint}] {' '.join(statement.split())[:200]}"
+        for endpoint, statement, plan, found in plans if found
+    ]
+    assert not failures, "\n".join(failures)
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import tempfile
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+
+# Largest accepted image upload, enforced while the file is being copied.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# (offset, magic bytes, extension). The saved file's extension always comes
+# from its content, never from the client's filename or Content-Type, so an
+# upload can't be served back as HTML or script.
+IMAGE_SIGNATURES = [
+    (0, b"\xff\xd8\xff", "jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (8, b"WEBP", "webp"),  # after b"RIFF" and a 4-byte length
+]
+SNIFF_BYTES = 16
+
+
+def detect_image_type(head: bytes) -> str | None:
+    """Returns the file extension for the image format `head` starts with, or None."""
+    for offset, magic, extension in IMAGE_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if extension == "webp" and not head.startswith(b"RIFF"):
+                continue
+            return extension
+    return None
+
+
+def _unsupported_type():
+    return HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="File must be a JPEG, PNG, GIF or WebP image",
+    )
+
+
+def _too_large():
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"Image must be at most {MAX_UPLOAD_BYTES} bytes",
+    )
+
+
+async def save_image(upload: UploadFile, directory: str) -> str:
+    """
+    Copies `upload` into `directory` in chunks, off the event loop, and returns
+    the stored file name: the SHA-256 of the content plus the detected extension.
+
+    The data goes to a temporary file that is renamed into place only once it
+    is complete, so a partial image is never visible. Identical uploads map to
+    the same name, and a second copy is simply discarded.
+    """
+    if upload.size is not None and upload.size > MAX_UPLOAD_BYTES:
+        raise _too_large()
+
+    fd, temp_path = await run_in_threadpool(tempfile.mkstemp, dir=directory, prefix=".upload-", suffix=".part")
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    extension = None
+
+    def write_chunk(out, chunk):
+        out.write(chunk)
+        digest.update(chunk)
+
+    def publish(name):
+        final_path = os.path.join(directory, name)
+        if os.path.exists(final_path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, final_path)
+
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise _too_large()
+                if extension is None:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                    # Reject non-images as soon as there are enough bytes to tell.
+                    if len(head) == SNIFF_BYTES and (extension := detect_image_type(head)) is None:
+                        raise _unsupported_type()
+                await run_in_threadpool(write_chunk, out, chunk)
+            await run_in_threadpool(out.flush)
+            await run_in_threadpool(os.fsync, out.fileno())
+
+        extension = extension or detect_image_type(head)
+        if extension is None:
+            raise _unsupported_type()
+        name = f"{digest.hexdigest()}.{extension}"
+        await run_in_threadpool(publish, name)
+        return name
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise